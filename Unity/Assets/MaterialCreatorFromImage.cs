@@ -7,6 +7,9 @@ public class MaterialCycler : MonoBehaviour
     [Tooltip("URL for Flask server to fetch images.")]
     public string imageURL = "http://3.145.161.54:5000/vrside"; // URL to the Flask server
     public float cycleInterval = 5f; // Interval in seconds between GET requests
+    public int longPollMs = 10000; // How long the server may hold a request waiting for a new frame
+
+    private long lastFrameSeq = -1; // Sequence number of the frame currently applied (-1 = none yet)
 
     private Renderer objectRenderer; // Reference to the GameObject's Renderer
     private Material skyboxMaterial; // Reference to the Skybox material (for Skybox updates)
@@ -39,16 +42,43 @@ public class MaterialCycler : MonoBehaviour
     {
         while (true)
         {
-            // Make the GET request to the Flask server to fetch the image
-            UnityWebRequest request = UnityWebRequestTexture.GetTexture(imageURL);
+            // Make the GET request to the Flask server to fetch the image. Once we know which
+            // frame we have, long-poll for the next one so only new frames are downloaded.
+            string url = lastFrameSeq >= 0 ? $"{imageURL}?after={lastFrameSeq}&wait={longPollMs}" : imageURL;
+            UnityWebRequest request = UnityWebRequestTexture.GetTexture(url);
             yield return request.SendWebRequest();
 
             if (request.isNetworkError || request.isHttpError)
             {
                 Debug.LogError("Failed to load image: " + request.error);
+                yield return new WaitForSeconds(cycleInterval); // Back off before retrying
+                continue;
+            }
+            else if (request.responseCode == 304)
+            {
+                // No new frame was rendered while we waited; ask again straight away. If the
+                // server's latest frame is older than ours it was restarted, so start over.
+                long serverSeq;
+                if (long.TryParse(request.GetResponseHeader("X-Frame-Seq"), out serverSeq) && serverSeq < lastFrameSeq)
+                {
+                    Debug.Log("Server frame sequence went back to " + serverSeq + "; fetching its latest frame.");
+                    lastFrameSeq = -1;
+                }
+                continue;
             }
             else
             {
+                string frameSeq = request.GetResponseHeader("X-Frame-Seq");
+                long previousSeq = lastFrameSeq;
+                if (!long.TryParse(frameSeq, out lastFrameSeq))
+                {
+                    lastFrameSeq = -1; // Server without frame sequence numbers, keep polling on the interval
+                }
+                else if (lastFrameSeq < previousSeq)
+                {
+                    Debug.Log("Server frame sequence went back to " + lastFrameSeq + "; following the new sequence.");
+                }
+
                 // Extract the texture from the response
                 Texture2D texture = ((DownloadHandlerTexture)request.downloadHandler).texture;
 
@@ -67,8 +97,11 @@ public class MaterialCycler : MonoBehaviour
                 }
             }
 
-            // Wait for the specified interval before making the next GET request
-            yield return new WaitForSeconds(cycleInterval);
+            // Long-polling already waits on the server; otherwise wait for the specified interval
+            if (lastFrameSeq < 0)
+            {
+                yield return new WaitForSeconds(cycleInterval);
+            }
         }
     }
 }
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""Buffered ingestion and pre-aggregated queries for the scene events posted to /analytics."""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Each segment directory holds one file per column. Numbers are packed doubles;
+# strings are uint32 codes into the segment's dictionary.txt (one JSON string per line).
+NUMBER_COLUMNS = ('timestamp', 'received_at')
+STRING_COLUMNS = ('scene_id', 'platform')
+COLUMN_FILES = {
+    'timestamp': 'timestamp.f64',
+    'received_at': 'received_at.f64',
+    'scene_id': 'scene_id.u32',
+    'platform': 'platform.u32',
+}
+DICTIONARY_FILE = 'dictionary.txt'
+
+
+def column_typecode(column):
+    return 'd' if column in NUMBER_COLUMNS else 'I'
+
+
+def parse_timestamp(value):
+    """Epoch seconds from an ISO 8601 string or a number of seconds (or milliseconds); None if unusable."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        if not math.isfinite(value):
+            return None
+        return value / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+def minute_of(timestamp):
+    """Start of the minute (epoch seconds) that timestamp falls in."""
+    return int(timestamp // 60 * 60)
+
+
+class AnalyticsLog:
+    """Event ingester that writes a time-rotated columnar log and keeps aggregates up to date.
+
+    ingest() only validates events, updates the in-memory aggregates and queues
+    the rows; a background thread appends queued rows to the log every
+    flush_interval seconds or once flush_size rows are waiting. The log lives
+    in one directory per rotate_seconds window of receive time, named by the
+    window's start. Aggregates (per-scene totals, and per-scene counts for each
+    minute of the last retain_minutes) are rebuilt from the log once at startup,
+    reading only the timestamp and scene_id columns, so queries never scan it.
+    """
+
+    def __init__(self, directory, rotate_seconds=3600, retain_minutes=1440, flush_size=512, flush_interval=1.0):
+        self.directory = directory
+        self.rotate_seconds = rotate_seconds
+        self.retain_minutes = retain_minutes
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._scene_totals = Counter()
+        self._per_minute = {}  # minute start (epoch seconds) -> Counter of scene_id
+        self._dictionary = (None, {})  # (segment name, string -> code) for the segment last written
+        self._load_aggregates()
+
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._flusher = threading.Thread(target=self._flush_loop, name='analytics-flusher', daemon=True)
+        self._flusher.start()
+
+    def ingest(self, events):
+        """Validate and record a list of event dicts; returns how many were recorded.
+
+        Raises ValueError, naming the offending event, if any event lacks a
+        scene_id; nothing from that batch is recorded in that case.
+        """
+        received_at = time.time()
+        rows = []
+        for position, event in enumerate(events):
+            if not isinstance(event, dict) or event.get('scene_id') in (None, ''):
+                raise ValueError(f"Event {position} needs a 'scene_id'.")
+            timestamp = parse_timestamp(event.get('timestamp'))
+            rows.append((received_at if timestamp is None else timestamp, received_at,
+                         str(event['scene_id']), str(event.get('platform') or '')))
+        # Work out every row's minute first so a failure cannot leave the aggregates half updated
+        minutes = [minute_of(row[0]) for row in rows]
+        with self._lock:
+            for row, minute in zip(rows, minutes):
+                self._count(minute, row[2])
+            self._pending.extend(rows)
+            pending = len(self._pending)
+        if pending >= self.flush_size:
+            self._wakeup.set()
+        return len(rows)
+
+    def pending(self):
+        """Number of events queued but not yet written to the log."""
+        return len(self._pending)
+
+    def top_scenes(self, limit=10):
+        """The most viewed scenes as [{"scene_id", "count"}], busiest first."""
+        with self._lock:
+            top = self._scene_totals.most_common(limit)
+        return [{"scene_id": scene_id, "count": count} for scene_id, count in top]
+
+    def per_minute(self, scene_id=None, since=None, until=None):
+        """Event counts per scene for each retained minute in [since, until), oldest first."""
+        with self._lock:
+            minutes = [(minute, dict(counts)) for minute, counts in self._per_minute.items()
+                       if (since is None or minute >= since - since % 60) and (until is None or minute < until)]
+        rows = []
+        for minute, counts in sorted(minutes):
+            for scene, count in sorted(counts.items()):
+                if scene_id is None or scene == scene_id:
+                    rows.append({"minute": minute, "scene_id": scene, "count": count})
+        return rows
+
+    def flush(self):
+        """Append every queued event to the log."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            segments = {}
+            for row in rows:
+                segments.setdefault(self._segment_name(row[1]), []).append(row)
+            for segment, segment_rows in segments.items():
+                self._write_segment(segment, segment_rows)
+            self._prune()
+
+    def close(self):
+        """Stop the flusher thread after writing out anything still queued."""
+        self._stopped = True
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+
+    def _count(self, minute, scene_id):
+        self._scene_totals[scene_id] += 1
+        if minute >= time.time() - self.retain_minutes * 60:
+            self._per_minute.setdefault(minute, Counter())[scene_id] += 1
+
+    def _prune(self):
+        cutoff = time.time() - self.retain_minutes * 60
+        with self._lock:
+            for minute in [minute for minute in self._per_minute if minute < cutoff - 60]:
+                del self._per_minute[minute]
+
+    def _segment_name(self, received_at):
+        return str(int(received_at // self.rotate_seconds * self.rotate_seconds))
+
+    def _segment_dictionary(self, segment):
+        name, dictionary = self._dictionary
+        if name != segment:
+            dictionary = {value: code for code, value in enumerate(self._read_dictionary(segment))}
+            self._dictionary = (segment, dictionary)
+            self._align_columns(segment)
+        return dictionary
+
+    def _align_columns(self, segment):
+        """Cut every column back to the shortest one, so rows written after a crash line up again."""
+        paths = {column: os.path.join(self.directory, segment, COLUMN_FILES[column]) for column in COLUMN_FILES}
+        sizes = {column: os.path.getsize(path) if os.path.exists(path) else 0 for column, path in paths.items()}
+        itemsizes = {column: array(column_typecode(column)).itemsize for column in COLUMN_FILES}
+        rows = min(sizes[column] // itemsizes[column] for column in COLUMN_FILES)
+        for column, path in paths.items():
+            size = rows * itemsizes[column]
+            if sizes[column] != size:
+                os.truncate(path, size)
+
+    def _read_dictionary(self, segment):
+        path = os.path.join(self.directory, segment, DICTIONARY_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file if line.endswith('\n')]
+
+    def _write_segment(self, segment, rows):
+        path = os.path.join(self.directory, segment)
+        os.makedirs(path, exist_ok=True)
+        dictionary = self._segment_dictionary(segment)
+        new_values = []
+        columns = {column: array(column_typecode(column)) for column in COLUMN_FILES}
+        for timestamp, received_at, scene_id, platform in rows:
+            columns['timestamp'].append(timestamp)
+            columns['received_at'].append(received_at)
+            for column, value in (('scene_id', scene_id), ('platform', platform)):
+                if value not in dictionary:
+                    dictionary[value] = len(dictionary)
+                    new_values.append(value)
+                columns[column].append(dictionary[value])
+        # New strings reach the dictionary before any code that refers to them.
+        if new_values:
+            with open(os.path.join(path, DICTIONARY_FILE), 'a', encoding='utf-8') as file:
+                file.write(''.join(json.dumps(value) + '\n' for value in new_values))
+        for column, values in columns.items():
+            with open(os.path.join(path, COLUMN_FILES[column]), 'ab') as file:
+                values.tofile(file)
+
+    def _read_column(self, segment, column):
+        values = array(column_typecode(column))
+        path = os.path.join(self.directory, segment, COLUMN_FILES[column])
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                data = file.read()
+            values.frombytes(data[:len(data) - len(data) % values.itemsize])
+        return values
+
+    def _load_aggregates(self):
+        for segment in sorted(name for name in os.listdir(self.directory) if name.isdigit()):
+            dictionary = self._read_dictionary(segment)
+            timestamps = self._read_column(segment, 'timestamp')
+            scene_ids = self._read_column(segment, 'scene_id')
+            # A crash mid-flush can leave columns of different lengths; only whole rows count.
+            for timestamp, code in zip(timestamps, scene_ids):
+                if code < len(dictionary) and math.isfinite(timestamp):
+                    self._count(minute_of(timestamp), dictionary[code])
+
+    def _flush_loop(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing analytics events to %s: %s", self.directory, e)
+                time.sleep(self.flush_interval)
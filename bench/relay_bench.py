@@ -0,0 +1,286 @@
+"""Load test for server.py that replays synthetic headset, renderer and uploader traffic.
+
+Each simulated headset gets its own session and three client threads:
+  pose sender - POSTs /gyro at --pose_hz, like Tracking.cs
+  renderer    - long-polls GET /gyro for new poses and POSTs a frame to /vrside
+                after --render_ms, like pic.py
+  viewer      - long-polls GET /vrside?after=<seq>, like MaterialCreatorFromImage.cs
+Optionally one uploader POSTs a --video_mb file to /upload every --video_interval
+seconds. Every frame carries the sequence id of the pose it was rendered from,
+so the viewer can report the end-to-end pose -> frame latency.
+
+pose_wait and frame_wait time the long-polls from request to response, so they
+are mostly the wait for the next pose or frame rather than server latency;
+handler latency shows up in pose_post and frame_post.
+
+By default the server is started from a scratch directory on a free port;
+pass --url to load an already running server instead.
+
+    python bench/relay_bench.py --headsets 4 --pose_hz 72 --duration 30
+"""
+import argparse
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'server.py')
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+POSE_SEQ = struct.Struct('<q')  # Pose sequence id stamped right after the PNG signature
+POSE = {'positionX': 0.0, 'positionY': 1.6, 'positionZ': 0.0, 'rotationX': 0.0, 'rotationY': 0.0, 'rotationZ': 0.0}
+
+
+class Stats:
+    """Latency samples and error count for one kind of request."""
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def summary(self, duration):
+        samples = sorted(self.samples)
+
+        def percentile(fraction):
+            return samples[min(int(fraction * len(samples)), len(samples) - 1)] * 1000 if samples else None
+
+        return {
+            "name": self.name,
+            "count": len(samples),
+            "errors": self.errors,
+            "per_second": len(samples) / duration,
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "max_ms": samples[-1] * 1000 if samples else None,
+        }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, threads, workdir):
+    """Run server.py from workdir and wait until it answers; returns the process."""
+    env = dict(os.environ, LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    process = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--host', '127.0.0.1', '--port', str(port),
+                                '--threads', str(threads)], cwd=workdir, env=env)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server.py exited with status {process.returncode} during startup.")
+        try:
+            requests.get(url, timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("server.py did not start within 30 seconds.")
+
+
+class Headset:
+    """One session's pose sender, renderer and viewer threads."""
+
+    def __init__(self, url, index, args, stats, stop):
+        self.url = url
+        self.session_id = f'bench-{index}'
+        self.args = args
+        self.stats = stats
+        self.stop = stop
+        self.pose_sent = {}  # Pose seq -> monotonic time the POST started
+        self.frame_padding = os.urandom(max(args.frame_kb * 1024 - len(PNG_SIGNATURE) - POSE_SEQ.size, 0))
+
+    def threads(self):
+        return [threading.Thread(target=target, name=f'{self.session_id}-{target.__name__}', daemon=True)
+                for target in (self.send_poses, self.render, self.view)]
+
+    def client(self):
+        session = requests.Session()
+        session.headers['X-Session-Id'] = self.session_id
+        return session
+
+    def send_poses(self):
+        client = self.client()
+        interval = 1.0 / self.args.pose_hz
+        next_send = time.monotonic()
+        while not self.stop.is_set():
+            started = time.monotonic()
+            try:
+                response = client.post(f'{self.url}/gyro', json=POSE, timeout=5)
+                response.raise_for_status()
+                self.pose_sent[response.json()['seq']] = started
+                self.stats['pose_post'].record(time.monotonic() - started)
+            except (requests.RequestException, KeyError, ValueError):
+                self.stats['pose_post'].error()
+            # Keep to the schedule; if the server falls behind, send the next pose right away
+            next_send = max(next_send + interval, time.monotonic() - interval)
+            self.stop.wait(max(next_send - time.monotonic(), 0))
+
+    def render(self):
+        client = self.client()
+        etag = None
+        while not self.stop.is_set():
+            started = time.monotonic()
+            try:
+                headers = {'If-None-Match': etag} if etag else {}
+                response = client.get(f'{self.url}/gyro', params={'wait': 1000}, headers=headers, timeout=5)
+                if response.status_code == 404:  # No pose posted yet
+                    self.stop.wait(0.05)
+                if response.status_code in (304, 404):
+                    continue
+                response.raise_for_status()
+                etag = response.headers.get('ETag')
+                pose_seq = response.json()['last_entry']['seq']
+                self.stats['pose_wait'].record(time.monotonic() - started)
+            except (requests.RequestException, KeyError, ValueError):
+                self.stats['pose_wait'].error()
+                self.stop.wait(0.1)
+                continue
+
+            self.stop.wait(self.args.render_ms / 1000.0)
+            frame = PNG_SIGNATURE + POSE_SEQ.pack(pose_seq) + self.frame_padding
+            started = time.monotonic()
+            try:
+                client.post(f'{self.url}/vrside', data=frame, headers={'Content-Type': 'image/png'},
+                            timeout=5).raise_for_status()
+                self.stats['frame_post'].record(time.monotonic() - started)
+            except requests.RequestException:
+                self.stats['frame_post'].error()
+
+    def view(self):
+        client = self.client()
+        frame_seq = -1
+        while not self.stop.is_set():
+            started = time.monotonic()
+            try:
+                response = client.get(f'{self.url}/vrside', params={'after': frame_seq, 'wait': 1000}, timeout=5)
+                if response.status_code == 404:  # No frame rendered yet
+                    self.stop.wait(0.05)
+                if response.status_code in (304, 404):
+                    continue
+                response.raise_for_status()
+                received = time.monotonic()
+                frame_seq = int(response.headers.get('X-Frame-Seq', frame_seq))
+                self.stats['frame_wait'].record(received - started)
+            except (requests.RequestException, ValueError):
+                self.stats['frame_wait'].error()
+                self.stop.wait(0.1)
+                continue
+            pose_seq, = POSE_SEQ.unpack_from(response.content, len(PNG_SIGNATURE))
+            sent = self.pose_sent.pop(pose_seq, None)
+            if sent is not None:
+                self.stats['pose_to_frame'].record(received - sent)
+
+
+def upload_videos(url, args, stats, stop):
+    """POST a synthetic capture video to /upload every video_interval seconds."""
+    client = requests.Session()
+    client.headers['X-Session-Id'] = 'bench-upload'
+    video = os.urandom(args.video_mb * 1024 * 1024)
+    count = 0
+    while not stop.is_set():
+        started = time.monotonic()
+        try:
+            client.post(f'{url}/upload', files={'file': (f'bench_{count}.mp4', video, 'video/mp4')},
+                        timeout=120).raise_for_status()
+            stats['video_upload'].record(time.monotonic() - started)
+        except requests.RequestException:
+            stats['video_upload'].error()
+        count += 1
+        stop.wait(max(args.video_interval - (time.monotonic() - started), 0))
+
+
+def run(url, args):
+    names = ['pose_post', 'pose_wait', 'frame_post', 'frame_wait', 'pose_to_frame', 'video_upload']
+    stats = {name: Stats(name) for name in names}
+    stop = threading.Event()
+    threads = []
+    for index in range(args.headsets):
+        threads += Headset(url, index, args, stats, stop).threads()
+    if args.video_mb > 0:
+        threads.append(threading.Thread(target=upload_videos, args=(url, args, stats, stop), daemon=True))
+
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    stop.wait(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    duration = time.monotonic() - started
+    return [stats[name].summary(duration) for name in names]
+
+
+def print_report(results, args):
+    print(f"\n{args.headsets} headsets at {args.pose_hz} Hz, {args.render_ms} ms renders, "
+          f"{args.frame_kb} KB frames, {args.duration:.0f} s")
+    print("pose_wait and frame_wait include the long-poll wait for new data, not just server time.")
+    print(f"{'request':<14}{'count':>8}{'errors':>8}{'per s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for result in results:
+        if not result['count'] and not result['errors']:
+            continue
+        cells = [f"{result[key]:>10.2f}" if result[key] is not None else f"{'-':>10}"
+                 for key in ('per_second', 'p50_ms', 'p99_ms', 'max_ms')]
+        print(f"{result['name']:<14}{result['count']:>8}{result['errors']:>8}{''.join(cells)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the relay server with synthetic VR clients.")
+    parser.add_argument("--url", default=None, help="Server to load; by default a local server.py is started.")
+    parser.add_argument("--threads", type=int, default=64, help="Worker threads for the local server.")
+    parser.add_argument("--headsets", type=int, default=2, help="Simulated headsets, each in its own session.")
+    parser.add_argument("--pose_hz", type=float, default=30.0, help="Pose POSTs per second per headset.")
+    parser.add_argument("--render_ms", type=float, default=20.0, help="Simulated render time per frame.")
+    parser.add_argument("--frame_kb", type=int, default=200, help="Size of each uploaded frame.")
+    parser.add_argument("--video_mb", type=int, default=0, help="Size of the periodic /upload video; 0 disables it.")
+    parser.add_argument("--video_interval", type=float, default=5.0, help="Seconds between video uploads.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run.")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    process = None
+    workdir = None
+    url = args.url
+    if url is None:
+        # Keep the server's pose logs, uploads and analytics out of the repository
+        workdir = tempfile.TemporaryDirectory(prefix='relay_bench_')
+        port = free_port()
+        process = start_server(port, args.threads, workdir.name)
+        url = f'http://127.0.0.1:{port}'
+    try:
+        results = run(url.rstrip('/'), args)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+            workdir.cleanup()
+
+    print_report(results, args)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
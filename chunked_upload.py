@@ -0,0 +1,231 @@
+"""Resumable chunked uploads for large /upload files such as capture videos."""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK = 1024 * 1024  # Bytes copied from the request stream to disk at a time
+SHA256_PATTERN = re.compile(r'[0-9a-fA-F]{64}')
+
+
+class UploadError(Exception):
+    """A chunked upload request that cannot be applied; carries the HTTP status to reply with."""
+
+    def __init__(self, message, status=400, upload=None):
+        super().__init__(message)
+        self.status = status
+        self.upload = upload
+
+
+def check_sha256(value, name="'sha256'"):
+    """Return a client-supplied digest lowercased (None if absent); raise UploadError unless it is hex SHA-256."""
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str) or not SHA256_PATTERN.fullmatch(value):
+        raise UploadError(f"{name} must be a 64-character hex SHA-256 digest.")
+    return value.lower()
+
+
+class ChunkedUploads:
+    """Tracks in-progress uploads that are streamed to disk one chunk at a time.
+
+    Each upload is a .part file plus a small JSON sidecar in partial_dir, so an
+    interrupted client can ask for the current offset and carry on, even across
+    a server restart. Chunks must arrive in order at the current offset. Uploads
+    with no activity for expiry seconds are deleted by a background thread.
+    """
+
+    def __init__(self, partial_dir, max_size, expiry=3600.0, reap_interval=60.0):
+        self.partial_dir = partial_dir
+        self.max_size = max_size
+        self.expiry = expiry
+        self.reap_interval = reap_interval
+        os.makedirs(partial_dir, exist_ok=True)
+
+        self._uploads = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._load_existing()
+        self._reaper = threading.Thread(target=self._reap_loop, name='upload-reaper', daemon=True)
+        self._reaper.start()
+
+    def create(self, filename, size, folder, sha256=None, session_id=None):
+        """Start a new upload of size bytes that will land in folder as filename."""
+        filename = secure_filename(filename or '')
+        if not filename:
+            raise UploadError("A filename is required.")
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("'size' must be a positive integer number of bytes.")
+        if size > self.max_size:
+            raise UploadError(f"Uploads are limited to {self.max_size} bytes.", status=413)
+        sha256 = check_sha256(sha256)
+
+        upload = {
+            "id": uuid.uuid4().hex,
+            "filename": filename,
+            "folder": folder,
+            "session_id": session_id,
+            "size": size,
+            "offset": 0,
+            "sha256": sha256,
+            "updated_at": time.time(),
+        }
+        open(self._part_path(upload["id"]), 'wb').close()
+        with self._lock:
+            self._uploads[upload["id"]] = upload
+            self._locks[upload["id"]] = threading.Lock()
+        self._save(upload)
+        return dict(upload)
+
+    def status(self, upload_id):
+        return dict(self._get(upload_id))
+
+    def append(self, upload_id, offset, stream, length, sha256=None):
+        """Stream length bytes from stream onto the upload at offset and return the new state.
+
+        If the chunk is short or its checksum does not match, the part file is
+        truncated back to offset so the client can resend the same chunk.
+        """
+        sha256 = check_sha256(sha256, "X-Chunk-SHA256")
+        with self._upload_lock(upload_id):
+            upload = self._get(upload_id)
+            if offset != upload["offset"]:
+                raise UploadError(f"Expected a chunk at offset {upload['offset']}.", status=409, upload=dict(upload))
+            if length is None or length <= 0:
+                raise UploadError("Chunks need a positive Content-Length.", status=411)
+            if offset + length > upload["size"]:
+                raise UploadError("Chunk runs past the declared upload size.", status=413)
+
+            digest = hashlib.sha256()
+            written = 0
+            with open(self._part_path(upload_id), 'r+b') as part:
+                part.seek(offset)
+                while written < length:
+                    block = stream.read(min(READ_BLOCK, length - written))
+                    if not block:
+                        break
+                    part.write(block)
+                    digest.update(block)
+                    written += len(block)
+                if written != length or (sha256 and digest.hexdigest() != sha256):
+                    part.truncate(offset)
+                    reason = "Chunk checksum mismatch." if written == length else "Chunk ended early."
+                    raise UploadError(reason, status=422, upload=dict(upload))
+
+            upload["offset"] = offset + written
+            upload["updated_at"] = time.time()
+            self._save(upload)
+            return dict(upload)
+
+    def finish(self, upload_id, sha256=None):
+        """Verify a complete upload and move it into its folder; returns the upload with its final "path"."""
+        sha256 = check_sha256(sha256)
+        with self._upload_lock(upload_id):
+            upload = self._get(upload_id)
+            if upload["offset"] != upload["size"]:
+                raise UploadError(f"Upload is incomplete ({upload['offset']} of {upload['size']} bytes).",
+                                  status=409, upload=dict(upload))
+            expected = sha256 or upload["sha256"]
+            if expected and self._file_sha256(self._part_path(upload_id)) != expected.lower():
+                raise UploadError("File checksum mismatch.", status=422, upload=dict(upload))
+
+            os.makedirs(upload["folder"], exist_ok=True)
+            filename = secure_filename(f"{int(time.time())}_{upload['filename']}")
+            file_path = os.path.join(upload["folder"], filename)
+            os.replace(self._part_path(upload_id), file_path)
+            self._forget(upload_id)
+            return dict(upload, path=file_path)
+
+    def abort(self, upload_id):
+        with self._upload_lock(upload_id):
+            self._get(upload_id)
+            self._forget(upload_id)
+
+    def expire(self):
+        """Delete uploads idle for longer than expiry and return their ids."""
+        cutoff = time.time() - self.expiry
+        with self._lock:
+            stale = [upload_id for upload_id, upload in self._uploads.items() if upload["updated_at"] < cutoff]
+        for upload_id in stale:
+            try:
+                self.abort(upload_id)
+            except UploadError:
+                pass  # Finished or aborted in the meantime
+        return stale
+
+    def _get(self, upload_id):
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise UploadError("No such upload.", status=404)
+        return upload
+
+    def _upload_lock(self, upload_id):
+        """The lock serializing work on one upload. Callers re-check the upload under it,
+        since it may have been finished or aborted while they waited."""
+        with self._lock:
+            lock = self._locks.get(upload_id)
+        if lock is None:
+            raise UploadError("No such upload.", status=404)
+        return lock
+
+    def _forget(self, upload_id):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+            self._locks.pop(upload_id, None)
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.partial_dir, f"{upload_id}.part")
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.partial_dir, f"{upload_id}.json")
+
+    def _save(self, upload):
+        temp_path = self._meta_path(upload["id"]) + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(upload, file)
+        os.replace(temp_path, self._meta_path(upload["id"]))
+
+    def _load_existing(self):
+        """Pick up uploads left by a previous run, dropping bytes past the last recorded chunk."""
+        for name in os.listdir(self.partial_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.partial_dir, name)) as file:
+                    upload = json.load(file)
+                with open(self._part_path(upload["id"]), 'r+b') as part:
+                    part.truncate(upload["offset"])
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Skipping unreadable partial upload %s: %s", name, e)
+                continue
+            self._uploads[upload["id"]] = upload
+            self._locks[upload["id"]] = threading.Lock()
+
+    @staticmethod
+    def _file_sha256(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(READ_BLOCK), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                for upload_id in self.expire():
+                    logger.info("Expired abandoned upload %s.", upload_id)
+            except Exception as e:
+                logger.error("Error expiring uploads in %s: %s", self.partial_dir, e)
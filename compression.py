@@ -0,0 +1,87 @@
+"""Content-Encoding negotiation and optional MessagePack bodies for the JSON endpoints."""
+import gzip
+import zlib
+
+try:
+    import brotli  # Optional; gzip is always available
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack  # Optional compact binary alternative to JSON
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Bodies worth compressing; images and packed floats gain little and cost CPU
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain',
+                          'application/msgpack', 'application/x-msgpack')
+
+
+def available_encodings():
+    """Content-Encodings this server can produce, preferred first."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """Pick the best available encoding from a parsed Accept-Encoding header, or None."""
+    encodings = available_encodings()
+    best = accept_encodings.best_match(encodings)
+    return best if best in encodings and accept_encodings[best] > 0 else None
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def gzip_stream(chunks, level):
+    """Gzip a streamed body chunk by chunk, flushing each so clients still see rows as they are produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response, accept_encodings, min_size=1024, level=5):
+    """Compress a response in place when the client accepts it.
+
+    Finished bodies under min_size are left alone. Streamed bodies (NDJSON
+    pages, CSV exports) are always gzipped on the fly since their size is
+    unknown up front.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    if response.is_streamed:
+        if accept_encodings['gzip'] > 0:
+            response.response = gzip_stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+    data = response.get_data()
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None or len(data) < min_size:
+        return response
+    response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def wants_msgpack(accept_mimetypes):
+    """True if the client prefers MessagePack over JSON and msgpack is installed."""
+    if msgpack is None or not accept_mimetypes:
+        return False
+    best = accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES)
+    return best in MSGPACK_MIMETYPES and accept_mimetypes[best] > accept_mimetypes['application/json']
+
+
+def pack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
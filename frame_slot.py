@@ -0,0 +1,159 @@
+"""In-memory slot holding the latest rendered frame for /vrside."""
+import io
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from PIL import Image  # Only needed to convert frames between encodings
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+Frame = namedtuple('Frame', ['seq', 'data', 'mimetype', 'etag', 'updated_at'])
+
+# Raw 8-bit RGBA frames: a (height, width) int32 header followed by the pixels,
+# the same header layout common.write_image uses for .bin images.
+RGBA_MIMETYPE = 'image/x-rgba'
+RGBA_HEADER = struct.Struct('<ii')
+
+FRAME_MIMETYPES = ('image/png', 'image/jpeg', 'image/webp', RGBA_MIMETYPE)
+PIL_FORMATS = {'image/png': 'PNG', 'image/jpeg': 'JPEG', 'image/webp': 'WEBP'}
+# Write-through file extension per encoding; raw RGBA uses common.write_image's .bin layout
+FILE_EXTENSIONS = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/webp': '.webp', RGBA_MIMETYPE: '.bin'}
+
+
+def sniff_mimetype(data):
+    """Guess the encoding of an image body from its magic bytes, or return None."""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def validate_frame(data, mimetype):
+    """Raise ValueError unless data is a plausible frame in the given encoding."""
+    if mimetype not in FRAME_MIMETYPES:
+        raise ValueError(f"Unsupported frame encoding {mimetype!r}, expected one of {', '.join(FRAME_MIMETYPES)}.")
+    if mimetype == RGBA_MIMETYPE:
+        if len(data) < RGBA_HEADER.size:
+            raise ValueError("Raw RGBA frames need a height/width header.")
+        height, width = RGBA_HEADER.unpack_from(data)
+        if height <= 0 or width <= 0 or len(data) != RGBA_HEADER.size + height * width * 4:
+            raise ValueError("Raw RGBA frame size does not match its height/width header.")
+    elif sniff_mimetype(data) != mimetype:
+        raise ValueError(f"Frame body is not valid {mimetype}.")
+
+
+def transcode(frame, mimetype, quality=90):
+    """Re-encode a frame into another encoding. Needs Pillow."""
+    if Image is None:
+        raise RuntimeError("Pillow is required to convert frames between encodings.")
+    if frame.mimetype == RGBA_MIMETYPE:
+        height, width = RGBA_HEADER.unpack_from(frame.data)
+        image = Image.frombuffer('RGBA', (width, height), frame.data[RGBA_HEADER.size:], 'raw', 'RGBA', 0, 1)
+    else:
+        image = Image.open(io.BytesIO(frame.data))
+    if mimetype == RGBA_MIMETYPE:
+        image = image.convert('RGBA')
+        return RGBA_HEADER.pack(image.height, image.width) + image.tobytes()
+    if mimetype == 'image/jpeg':
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, PIL_FORMATS[mimetype], quality=quality)
+    return output.getvalue()
+
+
+class FrameSlot:
+    """Latest frame, published by swapping in a fully built immutable Frame.
+
+    A frame is assembled completely before the slot's reference is replaced,
+    so readers always get either the previous frame or the new one and never
+    a partially written image. Optionally every frame is also written through
+    to disk (atomically, via a temp file and rename) for debugging; the file's
+    extension follows the frame's encoding, e.g. render.jpg for JPEG frames.
+
+    Sequence numbers start over at 0 in every new slot (server restart, session
+    re-open), so ETags also carry the slot's epoch to keep them from matching a
+    frame a client fetched from an earlier slot.
+    """
+
+    def __init__(self, write_through_path=None):
+        self.write_through_path = write_through_path
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._frame = None
+        self._next_seq = 0
+        self.epoch = f"{time.time_ns():x}"
+        self._encoded = {}  # Other encodings of the latest frame, by mimetype
+        self.waiters = 0  # Long-poll readers blocked in wait_for_newer
+        self._write_lock = threading.Lock()
+        self._written_seq = -1  # Newest frame renamed into place by _write_through
+
+    def publish(self, data, mimetype='image/png'):
+        """Make data the latest frame and return the new Frame."""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            frame = Frame(seq, bytes(data), mimetype, f"frame-{self.epoch}-{seq}", time.time())
+            self._frame = frame
+            self._encoded = {}
+            self._new_frame.notify_all()
+        if self.write_through_path:
+            self._write_through(frame)
+        return frame
+
+    def latest(self):
+        """Return the latest Frame, or None if nothing has been published."""
+        return self._frame
+
+    def next_seq(self):
+        """Sequence number the next published frame will get."""
+        return self._next_seq
+
+    def wait_for_newer(self, seq, timeout):
+        """Block until a frame newer than seq is published or timeout seconds pass, then return the latest."""
+        with self._new_frame:
+            self.waiters += 1
+            try:
+                self._new_frame.wait_for(lambda: self._next_seq - 1 > seq, timeout)
+            finally:
+                self.waiters -= 1
+            return self._frame
+
+    def encoded(self, frame, mimetype):
+        """Return frame's bytes in the given encoding, converting (and caching) when needed."""
+        if mimetype == frame.mimetype:
+            return frame.data
+        cached = self._encoded.get(mimetype)
+        if cached and cached[0] == frame.seq:
+            return cached[1]
+        data = transcode(frame, mimetype)
+        with self._lock:
+            if self._frame is frame:
+                self._encoded[mimetype] = (frame.seq, data)
+        return data
+
+    def _write_through(self, frame):
+        path = os.path.splitext(self.write_through_path)[0] + FILE_EXTENSIONS[frame.mimetype]
+        directory, name = os.path.split(os.path.abspath(path))
+        try:
+            # A temp file per publish, so concurrent publishers never write into the same file
+            with tempfile.NamedTemporaryFile(dir=directory, prefix=f".{name}.", delete=False) as file:
+                file.write(frame.data)
+            with self._write_lock:
+                if frame.seq > self._written_seq:
+                    os.replace(file.name, path)
+                    self._written_seq = frame.seq
+                else:
+                    os.remove(file.name)  # A newer frame is already in place
+        except OSError as e:
+            logger.error("Error writing frame %d to %s: %s", frame.seq, path, e)
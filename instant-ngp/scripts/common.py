@@ -17,6 +17,7 @@ from pathlib import Path, PurePosixPath
 from scipy.ndimage.filters import convolve1d
 import struct
 import sys
+import threading
 
 import flip
 import flip.utils
@@ -177,6 +178,52 @@ def write_image(file, img, quality=95):
 			img = linear_to_srgb(img)
 		write_image_imageio(file, img, quality)
 
+# Per-thread scratch buffers for encode_image, reused while the frame size stays the same
+_encode_scratch = threading.local()
+
+ENCODE_FORMATS = {"png": ".png", "jpeg": ".jpg", "jpg": ".jpg", "webp": ".webp"}  # Extension imageio picks the writer by
+
+def _scratch_buffer(name, shape, dtype):
+	buffer = getattr(_encode_scratch, name, None)
+	if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+		buffer = np.empty(shape, dtype)
+		setattr(_encode_scratch, name, buffer)
+	return buffer
+
+def encode_image(img, format="png", quality=95):
+	"""Encode a linear float image, e.g. a testbed.render() result, as PNG/JPEG/WebP bytes in memory.
+
+	Does the same linear->sRGB conversion as write_image, but quantizes into a reused
+	uint8 buffer and never touches the disk.
+	"""
+	format = format.lower()
+	if format not in ENCODE_FORMATS:
+		raise ValueError(f"Unsupported image format {format!r}, expected one of {', '.join(ENCODE_FORMATS)}.")
+	if img.shape[2] == 4:
+		srgb = _scratch_buffer("srgb", img.shape, np.float32)
+		# Unmultiply alpha
+		srgb[...,0:3] = 0.0
+		np.divide(img[...,0:3], img[...,3:4], out=srgb[...,0:3], where=img[...,3:4] != 0)
+		srgb[...,0:3] = linear_to_srgb(srgb[...,0:3])
+		srgb[...,3] = img[...,3]
+	else:
+		srgb = linear_to_srgb(img)
+
+	np.clip(srgb, 0.0, 1.0, out=srgb)
+	srgb *= 255.0
+	srgb += 0.5
+	pixels = _scratch_buffer("pixels", srgb.shape, np.uint8)
+	np.copyto(pixels, srgb, casting="unsafe")
+
+	kwargs = {}
+	if format in ("jpeg", "jpg", "webp"):
+		kwargs["quality"] = quality
+	if format in ("jpeg", "jpg"):
+		if pixels.shape[2] > 3:
+			pixels = pixels[:,:,:3]
+		kwargs["subsampling"] = 0
+	return imageio.imwrite(imageio.RETURN_BYTES, pixels, format=ENCODE_FORMATS[format], **kwargs)
+
 def trim(error, skip=0.000001):
 	error = np.sort(error.flatten())
 	size = error.size
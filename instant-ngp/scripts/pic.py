@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 
+import argparse
 import os
+import socket
 import sys
 import json
+import queue
+import threading
 import time  # Import time for measuring execution time
 import numpy as np
 import requests  # Import requests for HTTP POST
@@ -15,33 +19,143 @@ sys.path.append(pyngp_path)
 
 import pyngp as ngp  # noqa
 import common
+from relay_client import RelayClient
 
 
-class TransformHandler(FileSystemEventHandler):
-    def __init__(self, testbed, output_dir, resolution, server_url):
-        super().__init__()
+# Frame encodings the relay accepts on POST /vrside
+FRAME_MIMETYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+class StageTimer:
+    """Running per-stage timings, reported and reset every stats interval."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self._count += 1
+            self._total += seconds
+            self._max = max(self._max, seconds)
+
+    def report(self):
+        with self._lock:
+            count, total, longest = self._count, self._total, self._max
+            self._count, self._total, self._max = 0, 0.0, 0.0
+        if not count:
+            return f"{self.name} idle"
+        return f"{self.name} {total / count * 1000:.1f} ms avg / {longest * 1000:.1f} ms max"
+
+
+def put_latest(stage_queue, item):
+    """Queue item, discarding the oldest waiting item if the queue is full; returns True if one was discarded."""
+    while True:
+        try:
+            stage_queue.put_nowait(item)
+            return False
+        except queue.Full:
+            try:
+                stage_queue.get_nowait()
+                return True
+            except queue.Empty:
+                continue
+
+
+class FramePipeline:
+    """Encode and upload stages that run behind the renderer.
+
+    Rendered frames go through two bounded queues: a pool of encode workers
+    turns them into image bytes in memory and one upload thread posts those
+    through the RelayClient's keep-alive connection, so the next frame renders
+    while the previous one is still encoding or uploading. When a queue is full its oldest frame is
+    discarded, and the uploader skips any frame older than one it already
+    sent, so the headset always gets the newest frame available.
+    """
+
+    def __init__(self, client, image_format="png", quality=95, encode_workers=2, queue_size=2):
+        self.client = client
+        self.image_format = image_format
+        self.quality = quality
+        self.mimetype = FRAME_MIMETYPES[image_format]
+        self.encode_timer = StageTimer("encode")
+        self.upload_timer = StageTimer("upload")
+        self.discarded = 0
+        self._encode_queue = queue.Queue(queue_size)
+        self._upload_queue = queue.Queue(queue_size)
+        self._last_uploaded = -1
+        self._threads = [threading.Thread(target=self._encode_loop, name=f"encode-{worker}", daemon=True)
+                         for worker in range(encode_workers)]
+        self._threads.append(threading.Thread(target=self._upload_loop, name="upload", daemon=True))
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, frame_id, frame):
+        """Hand a rendered frame to the encoders without waiting for them."""
+        if put_latest(self._encode_queue, (frame_id, frame)):
+            self.discarded += 1
+
+    def report(self):
+        return f"{self.encode_timer.report()}, {self.upload_timer.report()}, {self.discarded} frames discarded"
+
+    def _encode_loop(self):
+        while True:
+            frame_id, frame = self._encode_queue.get()
+            start_time = time.perf_counter()
+            try:
+                # Straight from the float render buffer to bytes; each worker thread reuses its own scratch buffers
+                data = common.encode_image(frame, self.image_format, self.quality)
+            except Exception as e:
+                print(f"Error encoding frame {frame_id}: {e}")
+                continue
+            self.encode_timer.record(time.perf_counter() - start_time)
+            if put_latest(self._upload_queue, (frame_id, data)):
+                self.discarded += 1
+
+    def _upload_loop(self):
+        while True:
+            frame_id, data = self._upload_queue.get()
+            if frame_id < self._last_uploaded:
+                self.discarded += 1  # A newer frame finished encoding first
+                continue
+            start_time = time.perf_counter()
+            if send_image_to_server(data, self.client, self.mimetype):
+                self._last_uploaded = frame_id
+            self.upload_timer.record(time.perf_counter() - start_time)
+
+
+class PoseRenderer:
+    """Turns each new headset pose into a camera move and a render, handed off for encoding and upload."""
+
+    def __init__(self, testbed, resolution, frames):
         self.testbed = testbed
-        self.output_dir = output_dir
         self.resolution = resolution
-        self.server_url = server_url
+        self.frames = frames
+        self.render_timer = StageTimer("render")
+        self.frame_id = 0
         self.first_pass = True
         self.previous_transformation = [0.0] * 6  # Initial transformation is zero
 
-    def on_modified(self, event):
-        """Handle file modifications."""
-        if event.src_path.endswith("transform.json"):
-            print(f"Detected change in {event.src_path}. Applying transformations...")
-            self.process_transform_file(event.src_path)
-            time.sleep(0.1)
+    def report(self):
+        return f"{self.render_timer.report()}, {self.frames.report()}"
 
-    def process_transform_file(self, transform_file):
-        """Process the JSON file, calculate the delta transformation, and send the rendered image."""
+    def render_pose(self, rotation, position, received_at=None):
+        """Apply the change since the previous pose, render, and queue the frame for encoding and upload.
+
+        received_at is the time.perf_counter() at which the pose source got the
+        pose, used to report how long it took to reach the renderer.
+        """
         try:
-            with open(transform_file, "r") as f:
-                transform_data = json.load(f)
+            if received_at is not None:
+                print(f"Pose reached the renderer in {(time.perf_counter() - received_at) * 1000:.3f} ms.")
 
-            rotation = transform_data.get("rotation", [0.0, 0.0, 0.0]) * -1
-            position = transform_data.get("position", [0.0, 0.0, 0.0]) * 0.5
+            rotation = [-value for value in rotation]
+            position = [value * 0.5 for value in position]
 
             # Combine rotation and translation
             current_transformation = rotation + position
@@ -58,43 +172,187 @@ class TransformHandler(FileSystemEventHandler):
             print(f"Delta transformation: {delta_transformation}")
 
             # Measure start time
-            start_time = time.time()
+            start_time = time.perf_counter()
 
             # Apply the delta transformation
             apply_transformations(self.testbed, delta_transformation)
 
-            # Render and save the image
-            output_file = os.path.join(self.output_dir, "rendered_frame.png")
-            render_image(self.testbed, self.resolution, output_file)
+            # Render, then let the encode and upload stages take it from here
+            frame = render_image(self.testbed, self.resolution)
+            self.render_timer.record(time.perf_counter() - start_time)
+            self.frames.submit(self.frame_id, frame)
+            self.frame_id += 1
+        except Exception as e:
+            print(f"Error rendering pose: {e}")
+
+
+class TransformHandler(FileSystemEventHandler):
+    def __init__(self, on_pose):
+        super().__init__()
+        self.on_pose = on_pose
 
-            # Send the rendered image to the server
-            send_image_to_server(output_file, self.server_url)
+    def on_modified(self, event):
+        """Handle file modifications."""
+        if event.src_path.endswith("transform.json"):
+            print(f"Detected change in {event.src_path}. Applying transformations...")
+            self.process_transform_file(event.src_path)
 
-            # Measure end time and calculate elapsed time
-            elapsed_time = time.time() - start_time
-            print(f"Rendered image saved to {output_file}. Took {elapsed_time:.4f} seconds.")
+    def process_transform_file(self, transform_file):
+        """Read the pose vr_nerf.py wrote to transform_file and hand it to on_pose."""
+        try:
+            with open(transform_file, "r") as f:
+                transform_data = json.load(f)
+            received_at = time.perf_counter()
+            self.on_pose(transform_data.get("rotation", [0.0, 0.0, 0.0]),
+                         transform_data.get("position", [0.0, 0.0, 0.0]), received_at)
         except Exception as e:
             print(f"Error processing transform file: {e}")
 
 
-def render_image(testbed, resolution, output):
-    """Renders the current scene to an image."""
-    frame = testbed.render(resolution[0], resolution[1], spp=8, linear=True)
-    common.write_image(output, frame)
+class RenderScheduler:
+    """Latest-pose-wins scheduling between a pose source and the renderer.
 
+    submit() never blocks: it only replaces the single pending pose, so a pose
+    that arrives while a frame is rendering supersedes any older one that was
+    still waiting (counted as dropped), and a repeat of the pending or last
+    rendered pose, such as watchdog firing twice for one write, is ignored
+    (counted as coalesced). run() renders the pending pose on the calling
+    thread, one frame at a time and at most target_fps frames per second.
+    """
 
-def send_image_to_server(image_path, server_url):
-    """Send the rendered image to the specified server."""
+    def __init__(self, render, target_fps=30.0, stats_interval=5.0, report=None):
+        self.render = render
+        self.report = report
+        self.frame_interval = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.stats_interval = stats_interval
+        self.rendered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._pending = None
+        self._last_rendered = None
+        self._new_pose = threading.Condition()
+
+    def submit(self, rotation, position, received_at=None):
+        """Make this the pose to render next, superseding any pose still waiting."""
+        pose = (list(rotation), list(position))
+        with self._new_pose:
+            latest = self._pending[:2] if self._pending else self._last_rendered
+            if pose == latest:
+                self.coalesced += 1
+                return
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (*pose, received_at)
+            self._new_pose.notify()
+
+    def run(self):
+        """Render poses as they are submitted; never returns."""
+        next_frame = time.perf_counter()
+        next_stats = time.perf_counter() + self.stats_interval
+        while True:
+            with self._new_pose:
+                self._new_pose.wait_for(lambda: self._pending is not None)
+                # Hold the pose until the next frame slot; newer poses replace it meanwhile
+                while time.perf_counter() < next_frame:
+                    self._new_pose.wait(next_frame - time.perf_counter())
+                rotation, position, received_at = self._pending
+                self._pending = None
+                self._last_rendered = (rotation, position)
+            self.render(rotation, position, received_at)
+            self.rendered += 1
+            next_frame = max(next_frame + self.frame_interval, time.perf_counter())
+
+            if time.perf_counter() >= next_stats:
+                print(f"Rendered {self.rendered} frames; {self.dropped} poses dropped as superseded, "
+                      f"{self.coalesced} repeated poses coalesced."
+                      + (f" Stages: {self.report()}." if self.report else ""))
+                next_stats = time.perf_counter() + self.stats_interval
+
+
+# Pose sources. Each run(on_pose) blocks, calling on_pose(rotation, position, received_at)
+# from its own thread as soon as a pose arrives.
+class FilePoseSource:
+    """Fallback: watch the transform.json that vr_nerf.py writes."""
+
+    def __init__(self, directory="scripts"):
+        self.directory = directory
+
+    def run(self, on_pose):
+        observer = Observer()
+        observer.schedule(TransformHandler(on_pose), path=self.directory, recursive=False)
+        print("Watching for changes in transform.json...")
+        observer.start()
+        try:
+            while observer.is_alive():
+                observer.join(1)
+        finally:
+            observer.stop()
+            observer.join()
+
+
+class RelayPoseSource:
+    """Subscribe to the relay's /gyro/stream directly, skipping vr_nerf.py and the file."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def run(self, on_pose):
+        last_seq = None
+        attempt = 0
+        print(f"Subscribing to poses from {self.client.url('/gyro/stream')}...")
+        while True:
+            try:
+                for entry in self.client.stream_events("/gyro/stream", last_seq):
+                    received_at = time.perf_counter()
+                    attempt = 0
+                    last_seq = entry.get("seq", last_seq)
+                    on_pose([entry.get("rotationX", 0.0), entry.get("rotationY", 0.0), entry.get("rotationZ", 0.0)],
+                            [entry.get("positionX", 0.0), entry.get("positionY", 0.0), entry.get("positionZ", 0.0)],
+                            received_at)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Pose stream interrupted: {e}")
+            # Back off between reconnects while the relay is unreachable
+            time.sleep(self.client.retry_delay(attempt))
+            attempt += 1
+
+
+class SocketPoseSource:
+    """Receive poses pushed by vr_nerf.py over a local UDP socket, one JSON datagram per pose."""
+
+    def __init__(self, host="127.0.0.1", port=5055):
+        self.address = (host, port)
+
+    def run(self, on_pose):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(self.address)
+            print(f"Listening for poses on udp://{self.address[0]}:{self.address[1]}...")
+            while True:
+                datagram = sock.recv(65536)
+                received_at = time.perf_counter()
+                try:
+                    transform_data = json.loads(datagram)
+                except ValueError as e:
+                    print(f"Ignoring malformed pose datagram: {e}")
+                    continue
+                on_pose(transform_data.get("rotation", [0.0, 0.0, 0.0]),
+                        transform_data.get("position", [0.0, 0.0, 0.0]), received_at)
+
+
+def render_image(testbed, resolution):
+    """Renders the current scene to a linear float image."""
+    return testbed.render(resolution[0], resolution[1], spp=8, linear=True)
+
+
+def send_image_to_server(data, client, mimetype="image/png"):
+    """Send encoded image bytes to the relay's /vrside as a raw body; returns True on success."""
     try:
-        with open(image_path, "rb") as img_file:
-            files = {"file": img_file}
-            response = requests.post(server_url, files=files)
-            if response.status_code == 200:
-                print(f"Image successfully sent to {server_url}. Response: {response.json()}")
-            else:
-                print(f"Failed to send image. Status code: {response.status_code}, Response: {response.text}")
+        response = client.post("/vrside", data=data, headers={"Content-Type": mimetype})
+        if response.status_code == 200:
+            return True
+        print(f"Failed to send image. Status code: {response.status_code}, Response: {response.text}")
     except Exception as e:
         print(f"Error sending image to server: {e}")
+    return False
 
 
 def apply_transformations(testbed, transformation):
@@ -141,15 +399,42 @@ def apply_transformations(testbed, transformation):
     testbed.camera_matrix = cam_matrix
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render NeRF views for incoming headset poses and upload them.")
+    parser.add_argument("--pose_source", choices=["relay", "socket", "file"], default="relay",
+                        help="Where poses come from: the relay's pose stream, a local UDP socket fed by "
+                             "vr_nerf.py, or the transform.json file vr_nerf.py writes (the old path).")
+    parser.add_argument("--relay_url", default="http://3.145.161.54:5000", help="Relay server base URL.")
+    parser.add_argument("--http_timeout", type=float, default=10.0, help="Seconds to wait for a relay response.")
+    parser.add_argument("--http_retries", type=int, default=3, help="Retries for failed relay requests, with backoff.")
+    parser.add_argument("--pose_host", default="127.0.0.1", help="Address to receive poses on with --pose_source socket.")
+    parser.add_argument("--pose_port", type=int, default=5055, help="UDP port to receive poses on with --pose_source socket.")
+    parser.add_argument("--target_fps", type=float, default=30.0,
+                        help="Most frames to render per second; newer poses replace waiting ones. 0 for no limit.")
+    parser.add_argument("--encode_workers", type=int, default=2, help="Threads encoding rendered frames.")
+    parser.add_argument("--frame_format", choices=list(FRAME_MIMETYPES), default="png",
+                        help="Encoding of the frames sent to the relay.")
+    parser.add_argument("--frame_quality", type=int, default=95, help="JPEG/WebP quality of the frames sent to the relay.")
+    return parser.parse_args()
+
+
+def make_pose_source(args, client):
+    if args.pose_source == "relay":
+        return RelayPoseSource(client)
+    if args.pose_source == "socket":
+        return SocketPoseSource(args.pose_host, args.pose_port)
+    return FilePoseSource("scripts")
+
+
 def main():
+    args = parse_args()
+
     # Set up the testbed
     scene = "vid"  # Replace with your scene path
     snapshot = "vid/base.msgpack"  # Replace with your snapshot path
-    output_dir = "output"  # Replace with your output directory
-    server_url = "http://3.145.161.54:5000/vrside"  # Server URL for image upload
 
-    # Ensure the output directory exists
-    os.makedirs(output_dir, exist_ok=True)
+    # One pooled keep-alive client for every frame upload (and the pose stream)
+    client = RelayClient(args.relay_url, read_timeout=args.http_timeout, retries=args.http_retries)
 
     testbed = ngp.Testbed(ngp.TestbedMode.Nerf)
     testbed.load_training_data(scene)
@@ -157,20 +442,17 @@ def main():
 
     resolution = [960, 540]  # Default resolution
 
-    # Set up watchdog observer
-    event_handler = TransformHandler(testbed, output_dir, resolution, server_url)
-    observer = Observer()
-    observer.schedule(event_handler, path="scripts", recursive=False)
-
-    print("Watching for changes in transform.json...")
-    observer.start()
-
+    # Poses arrive on the source's thread; the scheduler renders only the latest one here on the
+    # main thread, which owns the testbed, while encoding and upload run behind it
+    frames = FramePipeline(client, args.frame_format, args.frame_quality, encode_workers=args.encode_workers)
+    frames.start()
+    renderer = PoseRenderer(testbed, resolution, frames)
+    scheduler = RenderScheduler(renderer.render_pose, args.target_fps, report=renderer.report)
+    threading.Thread(target=make_pose_source(args, client).run, args=(scheduler.submit,), name="pose-source", daemon=True).start()
     try:
-        while True:
-            pass  # Keep the script running to monitor changes
+        scheduler.run()
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+        pass
 
 
 if __name__ == "__main__":
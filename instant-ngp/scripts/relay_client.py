@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""Shared HTTP client for talking to the relay server from pic.py and vr_nerf.py."""
+
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class RelayClient:
+    """Keep-alive, pooled connection to the relay with default timeouts and retries.
+
+    One client reuses its TCP connections across requests, so frame uploads and
+    pose polls stop paying for a handshake each time. Connection errors and
+    502/503/504 replies are retried up to retries times with exponential
+    backoff. Requests may be given a path ("/vrside") or a full URL.
+    """
+
+    def __init__(self, base_url, connect_timeout=3.0, read_timeout=10.0, retries=3, backoff=0.2, max_backoff=5.0,
+                 pool_size=4):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(502, 503, 504),
+                      allowed_methods=None, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path):
+        return path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
+
+    def request(self, method, path, timeout=None, **kwargs):
+        return self.session.request(method, self.url(path), timeout=timeout or self.timeout, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def retry_delay(self, attempt):
+        """Seconds to wait before reconnect attempt number attempt (0 for the first)."""
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+    def stream_events(self, path, last_event_id=None, read_timeout=60.0):
+        """Yield the JSON data of each Server-Sent Event from path until the stream ends.
+
+        Raises requests.RequestException or ValueError when the stream fails;
+        callers reconnect, passing the last seen id as last_event_id.
+        """
+        headers = {"Accept": "text/event-stream"}
+        if last_event_id is not None:
+            headers["Last-Event-ID"] = str(last_event_id)
+        with self.get(path, headers=headers, stream=True, timeout=(self.timeout[0], read_timeout)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    yield json.loads(line[5:])
@@ -1,20 +1,47 @@
 import requests
+import socket
+import sys
 import time
 import json
 import os
 
-# Endpoint for gyroscope data
-GYRO_ENDPOINT = "http://3.145.161.54:5000/gyro"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+from relay_client import RelayClient
+
+# Relay server, and its endpoint for gyroscope data
+RELAY_URL = "http://3.145.161.54:5000"
+GYRO_ENDPOINT = "/gyro"
+
+# Server-Sent Events stream of new poses; set USE_POSE_STREAM to False to poll GYRO_ENDPOINT instead
+GYRO_STREAM_ENDPOINT = "/gyro/stream"
+USE_POSE_STREAM = True
+
+# How long each request long-polls the server for a new pose, in milliseconds
+GYRO_WAIT_MS = 1000
+
+# Every request reuses one pooled keep-alive connection, retrying failures with backoff
+relay = RelayClient(RELAY_URL, connect_timeout=3.0, read_timeout=5.0 + GYRO_WAIT_MS / 1000, retries=3)
 
 # Path to save the transformation JSON
 TRANSFORM_JSON_PATH = "scripts/transform.json"
 
-def fetch_gyro_data():
+# Set to pic.py's --pose_host/--pose_port, e.g. ("127.0.0.1", 5055), to push each pose to
+# pic.py --pose_source socket over UDP instead of writing TRANSFORM_JSON_PATH
+POSE_SOCKET_ADDRESS = None
+pose_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+def fetch_gyro_data(last_seq=None):
     """
     Fetch gyroscope data from the external endpoint and parse it.
+    Long-polls until the server has a pose newer than last_seq or GYRO_WAIT_MS passes.
+    Returns (rotation, position, seq), where seq is the server's sequence id for the pose;
+    rotation and position are None with seq == last_seq when no new pose arrived.
     """
+    headers = {} if last_seq is None else {"If-None-Match": f'"pose-{last_seq}"'}
     try:
-        response = requests.get(GYRO_ENDPOINT, timeout=5)  # Add timeout to avoid hanging
+        response = relay.get(GYRO_ENDPOINT, params={"wait": GYRO_WAIT_MS}, headers=headers)
+        if response.status_code == 304:
+            return None, None, last_seq
         response.raise_for_status()
         data = response.json()
 
@@ -22,24 +49,36 @@ def fetch_gyro_data():
         last_entry = data.get("last_entry", {})
         if not last_entry:
             print("No 'last_entry' found in the response.")
-            return None
-
-        # Parse rotation and position
-        rotation = [
-            float(last_entry.get("rotationX", 0.0)),
-            float(last_entry.get("rotationY", 0.0)),
-            float(last_entry.get("rotationZ", 0.0)),
-        ]
-        position = [
-            float(last_entry.get("positionX", 0.0)),
-            float(last_entry.get("positionY", 0.0)),
-            float(last_entry.get("positionZ", 0.0)),
-        ]
-
-        return rotation, position
+            return None, None, None
+
+        return parse_pose(last_entry)
     except (requests.RequestException, ValueError) as e:
         print(f"Error fetching gyroscope data: {e}")
-        return None, None
+        return None, None, None
+
+def stream_gyro_data(last_seq=None):
+    """
+    Subscribe to the server's pose stream and yield (rotation, position, seq) for every new pose.
+    The server only ever sends the newest pose, so nothing queues up if we fall behind.
+    """
+    for entry in relay.stream_events(GYRO_STREAM_ENDPOINT, last_seq):
+        yield parse_pose(entry)
+
+def parse_pose(entry):
+    """
+    Parse rotation, position and sequence id out of a pose entry sent by the server.
+    """
+    rotation = [
+        float(entry.get("rotationX", 0.0)),
+        float(entry.get("rotationY", 0.0)),
+        float(entry.get("rotationZ", 0.0)),
+    ]
+    position = [
+        float(entry.get("positionX", 0.0)),
+        float(entry.get("positionY", 0.0)),
+        float(entry.get("positionZ", 0.0)),
+    ]
+    return rotation, position, entry.get("seq")
 
 def save_to_json(rotation, position):
     """
@@ -57,17 +96,69 @@ def save_to_json(rotation, position):
     except IOError as e:
         print(f"Error saving to JSON file: {e}")
 
-def main():
-    interval = 0.1  # Time interval in seconds
+def send_to_socket(rotation, position, seq):
+    """
+    Push the pose to pic.py as a single UDP datagram; nothing touches the disk.
+    """
+    datagram = json.dumps({"rotation": rotation, "position": position, "seq": seq}).encode()
+    try:
+        pose_socket.sendto(datagram, POSE_SOCKET_ADDRESS)
+    except OSError as e:
+        print(f"Error sending pose to {POSE_SOCKET_ADDRESS}: {e}")
+
+def publish_pose(rotation, position, seq):
+    """
+    Hand a new pose to the renderer, over the pose socket if one is configured or through transform.json.
+    """
+    if POSE_SOCKET_ADDRESS:
+        send_to_socket(rotation, position, seq)
+    else:
+        save_to_json(rotation, position)
+
+def stream_loop(interval):
+    """
+    Publish every pose pushed by the server to the renderer, reconnecting when the stream drops.
+    """
+    last_seq = None
+    attempt = 0
     while True:
-        rotation, position = fetch_gyro_data()
+        try:
+            for rotation, position, seq in stream_gyro_data(last_seq):
+                print(f"Rotation: {rotation}, Position: {position}")
+                publish_pose(rotation, position, seq)
+                last_seq = seq
+                attempt = 0
+        except (requests.RequestException, ValueError) as e:
+            print(f"Pose stream interrupted: {e}")
+        # Back off between reconnects while the relay is unreachable
+        time.sleep(max(interval, relay.retry_delay(attempt)))
+        attempt += 1
+
+def poll_loop(interval):
+    """
+    Long-poll the server for new poses and publish them to the renderer.
+    """
+    last_seq = None
+    while True:
+        rotation, position, seq = fetch_gyro_data(last_seq)
         if rotation and position:
-            print(f"Rotation: {rotation}, Position: {position}")
-            save_to_json(rotation, position)
-        else:
+            # Only publish (and trigger a render) for a pose we have not seen yet
+            if seq is None or seq != last_seq:
+                print(f"Rotation: {rotation}, Position: {position}")
+                publish_pose(rotation, position, seq)
+                last_seq = seq
+            if seq is None:
+                time.sleep(interval)  # Server without sequence ids, fall back to polling
+        elif seq is None:
             print("Failed to fetch gyroscope data or invalid format.")
+            time.sleep(interval)  # Wait for the specified interval before fetching again
 
-        time.sleep(interval)  # Wait for the specified interval before fetching again
+def main():
+    interval = 0.1  # Time interval in seconds
+    if USE_POSE_STREAM:
+        stream_loop(interval)
+    else:
+        poll_loop(interval)
 
 if __name__ == "__main__":
     main()
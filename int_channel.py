@@ -0,0 +1,105 @@
+"""Bounded, optionally persistent storage for the integers posted to /int_channel."""
+import os
+import threading
+from array import array
+from collections import Counter
+
+# Values are stored as signed 64-bit integers, in the ring and on disk alike.
+TYPECODE = 'q'
+ITEM_SIZE = array(TYPECODE).itemsize
+
+
+class IntChannel:
+    """Ring of the most recent integers, with an optional append-only log behind it.
+
+    Every value gets a sequence id, its position in the channel since it was
+    first created. The ring keeps the last capacity values in one flat array;
+    when a log path is given each value is also appended to it, so the channel
+    survives restarts and reads older than the ring fall back to the file.
+    """
+
+    def __init__(self, capacity=10000, path=None):
+        self.capacity = capacity
+        self.path = path
+        self._ring = array(TYPECODE, bytes(capacity * ITEM_SIZE))
+        self._lock = threading.Lock()
+        self._count = 0
+        self._file = None
+        if path:
+            self._file = open(path, 'a+b')
+            # Drop a torn trailing value left behind by a crash mid-write.
+            size = self._file.seek(0, os.SEEK_END)
+            self._count = size // ITEM_SIZE
+            if self._count * ITEM_SIZE != size:
+                self._file.truncate(self._count * ITEM_SIZE)
+            for seq, value in enumerate(self._read_file(max(self._count - capacity, 0), self._count),
+                                        start=max(self._count - capacity, 0)):
+                self._ring[seq % capacity] = value
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+
+    def append(self, value):
+        """Store one value and return its sequence id; raises OverflowError outside int64."""
+        with self._lock:
+            seq = self._count
+            self._ring[seq % self.capacity] = value
+            if self._file:
+                self._file.write(array(TYPECODE, [value]).tobytes())
+                self._file.flush()
+            self._count = seq + 1
+        return seq
+
+    def latest(self):
+        """Return the newest value as (seq, value), or None if empty."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            seq = self._count - 1
+            return seq, self._ring[seq % self.capacity]
+
+    def read_range(self, start=0, stop=None):
+        """Return the values in [start, stop) as an array, reading the log for anything older than the ring."""
+        with self._lock:
+            stop = self._count if stop is None else min(stop, self._count)
+            ring_start = max(self._count - self.capacity, 0)
+            start = max(start, 0 if self._file else ring_start)
+            if start >= stop:
+                return array(TYPECODE)
+            values = self._read_file(start, min(stop, ring_start)) if start < ring_start else array(TYPECODE)
+            first, last = max(start, ring_start) % self.capacity, (stop - 1) % self.capacity + 1
+            if stop > max(start, ring_start):
+                if first < last:
+                    values += self._ring[first:last]
+                else:
+                    values += self._ring[first:] + self._ring[:last]
+        return values
+
+    def first_available(self):
+        """Oldest sequence id that read_range can still return."""
+        return 0 if self._file else max(self._count - self.capacity, 0)
+
+    def stats(self, start=None):
+        """Count, last value and a value histogram over the values from start, or over the ring."""
+        values = self.read_range(max(len(self) - self.capacity, 0) if start is None else start)
+        latest = self.latest()
+        return {
+            "count": len(values),
+            "total": len(self),
+            "last": latest[1] if latest else None,
+            "last_seq": latest[0] if latest else None,
+            "histogram": {str(value): count for value, count in sorted(Counter(values).items())},
+        }
+
+    def _read_file(self, start, stop):
+        values = array(TYPECODE)
+        if start < stop:
+            self._file.seek(start * ITEM_SIZE)
+            values.frombytes(self._file.read((stop - start) * ITEM_SIZE))
+            self._file.seek(0, os.SEEK_END)
+        return values
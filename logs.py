@@ -0,0 +1,32 @@
+"""Non-blocking logging: handlers run on a listener thread, callers only enqueue records."""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+_listener = None
+
+
+def configure(level='INFO'):
+    """Route the root logger through a queue so request threads never wait on stderr.
+
+    Safe to call more than once; only the first call installs the listener.
+    """
+    global _listener
+    root = logging.getLogger()
+    level = level.upper() if isinstance(level, str) else level
+    root.setLevel(level)
+    # werkzeug forces its request log to INFO unless told otherwise
+    logging.getLogger('werkzeug').setLevel(level)
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.handlers = [logging.handlers.QueueHandler(records)]
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
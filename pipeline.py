@@ -0,0 +1,165 @@
+"""Background pipeline turning uploaded captures into trainable NeRF datasets."""
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+COLMAP2NERF = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instant-ngp', 'scripts', 'colmap2nerf.py')
+
+# Stages run in this order; each has its own worker threads, so one job's COLMAP
+# run overlaps the next job's frame extraction.
+STAGES = ('extract', 'filter', 'reconstruct')
+
+
+class Job:
+    """One capture video moving through the pipeline, with per-stage timings."""
+
+    def __init__(self, source_path, output_root, session_id, on_extracted=None):
+        self.id = uuid.uuid4().hex
+        self.source_path = source_path
+        self.output_dir = os.path.join(output_root, self.id)
+        self.session_id = session_id
+        self.on_extracted = on_extracted
+        self.state = 'queued'
+        self.stage = STAGES[0]
+        self.error = None
+        self.created_at = time.time()
+        self.stages = {stage: {"state": 'pending'} for stage in STAGES}
+
+    @property
+    def images_dir(self):
+        return os.path.join(self.output_dir, 'images')
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "source": os.path.basename(self.source_path),
+            "state": self.state,
+            "stage": self.stage,
+            "error": self.error,
+            "created_at": self.created_at,
+            "output_dir": self.output_dir,
+            "stages": self.stages,
+        }
+
+
+class Pipeline:
+    """Job queue with a small local worker pool per stage.
+
+    extract     - ffmpeg pulls frames out of the video at video_fps
+    filter      - drops the blurriest frames, keeping keep_fraction of them by
+                  variance of the Laplacian (skipped if OpenCV is not installed)
+    reconstruct - runs COLMAP and writes transforms.json via colmap2nerf.py
+    concurrency maps each stage to its number of worker threads.
+    """
+
+    def __init__(self, concurrency=None, video_fps=2, keep_fraction=0.8, ffmpeg='ffmpeg'):
+        self.concurrency = dict({'extract': 2, 'filter': 2, 'reconstruct': 1}, **(concurrency or {}))
+        self.video_fps = video_fps
+        self.keep_fraction = keep_fraction
+        self.ffmpeg = ffmpeg
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queues = {stage: queue.Queue() for stage in STAGES}
+        for stage in STAGES:
+            for worker in range(self.concurrency[stage]):
+                threading.Thread(target=self._work, args=(stage,), name=f'pipeline-{stage}-{worker}',
+                                 daemon=True).start()
+
+    def submit(self, source_path, output_root, session_id, on_extracted=None):
+        """Queue a capture whose dataset goes under output_root/<job id>.
+
+        on_extracted(job) runs once the source file is no longer needed.
+        """
+        job = Job(source_path, output_root, session_id, on_extracted)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._enqueue(job, STAGES[0])
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def queue_depths(self):
+        return {stage: self._queues[stage].qsize() for stage in STAGES}
+
+    def _enqueue(self, job, stage):
+        job.stages[stage].update(state='queued', queued_at=time.time())
+        self._queues[stage].put(job)
+
+    def _work(self, stage):
+        run_stage = getattr(self, f'_{stage}')
+        while True:
+            job = self._queues[stage].get()
+            timing = job.stages[stage]
+            job.state, job.stage = 'running', stage
+            timing.update(state='running', started_at=time.time(), waited=round(time.time() - timing["queued_at"], 3))
+            try:
+                note = run_stage(job)
+            except Exception as e:
+                timing.update(state='failed', duration=round(time.time() - timing["started_at"], 3))
+                job.state, job.error = 'failed', f"{stage}: {e}"
+                logger.error("Job %s failed in %s: %s", job.id, stage, e)
+                continue
+            timing.update(state='skipped' if note else 'done', duration=round(time.time() - timing["started_at"], 3))
+            if note:
+                timing["note"] = note
+
+            next_index = STAGES.index(stage) + 1
+            if next_index < len(STAGES):
+                job.state = 'queued'
+                self._enqueue(job, STAGES[next_index])
+            else:
+                job.state = 'done'
+
+    def _run(self, job, stage, command):
+        """Run one external command for a stage, logging its output next to the dataset."""
+        with open(os.path.join(job.output_dir, f'{stage}.log'), 'a') as log:
+            result = subprocess.run(command, cwd=job.output_dir, stdout=log, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            raise RuntimeError(f"{os.path.basename(command[0])} exited with {result.returncode}, see {stage}.log")
+
+    def _extract(self, job):
+        os.makedirs(job.images_dir, exist_ok=True)
+        self._run(job, 'extract', [self.ffmpeg, '-y', '-i', os.path.abspath(job.source_path),
+                                   '-qscale:v', '1', '-qmin', '1', '-vf', f'fps={self.video_fps}',
+                                   os.path.join('images', '%04d.jpg')])
+        if job.on_extracted:
+            job.on_extracted(job)
+
+    def _filter(self, job):
+        try:
+            import cv2
+        except ImportError:
+            return "OpenCV is not installed, kept every frame"
+        frames = sorted(os.listdir(job.images_dir))
+        if len(frames) < 3:
+            return "too few frames to filter"
+        scores = {}
+        for frame in frames:
+            image = cv2.imread(os.path.join(job.images_dir, frame), cv2.IMREAD_GRAYSCALE)
+            scores[frame] = cv2.Laplacian(image, cv2.CV_64F).var() if image is not None else 0.0
+        keep = max(int(len(frames) * self.keep_fraction), 3)
+        for frame in sorted(frames, key=scores.get)[:len(frames) - keep]:
+            os.remove(os.path.join(job.images_dir, frame))
+        job.stages['filter']["kept"] = keep
+
+    def _reconstruct(self, job):
+        # Frames come from one video, so the sequential matcher is the right COLMAP choice
+        self._run(job, 'reconstruct', [sys.executable, COLMAP2NERF, '--images', 'images', '--run_colmap',
+                                       '--overwrite', '--colmap_matcher', 'sequential', '--colmap_db', 'colmap.db',
+                                       '--text', 'colmap_text', '--aabb_scale', '16', '--out', 'transforms.json'])
+        if not os.path.exists(os.path.join(job.output_dir, 'transforms.json')):
+            raise RuntimeError("colmap2nerf.py did not write transforms.json")
@@ -0,0 +1,303 @@
+"""Fixed-record binary storage for the pose samples posted to /gyro."""
+import csv
+import io
+import logging
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+POSE_FIELDS = ['positionX', 'positionY', 'positionZ', 'rotationX', 'rotationY', 'rotationZ']
+
+# File layout: a small header followed by fixed-size little-endian records.
+# Each record is the server receive time followed by the six pose floats.
+MAGIC = b'POSE'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')  # magic, version, record size, reserved
+RECORD = struct.Struct('<7d')     # received_at, positionXYZ, rotationXYZ
+
+
+class PoseStore:
+    """Append-only pose log with O(1) access to the latest record.
+
+    The record count is kept in memory, so finding the latest pose is a single
+    seek to the last record and any range of records is one contiguous read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            self._file = open(path, 'r+b')
+            magic, version, record_size, _ = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                self._file.close()
+                raise ValueError(f"{path} is not a version {VERSION} pose log.")
+        else:
+            self._file = open(path, 'w+b')
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+            self._file.flush()
+
+        # Drop a torn trailing record left behind by a crash mid-write.
+        size = self._file.seek(0, os.SEEK_END)
+        self._count = (size - HEADER.size) // RECORD.size
+        if HEADER.size + self._count * RECORD.size != size:
+            self._file.truncate(HEADER.size + self._count * RECORD.size)
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def append(self, received_at, values):
+        """Append one pose and return its record index."""
+        return self.extend([(received_at, *values)])
+
+    def extend(self, records):
+        """Append (received_at, *values) tuples in one write and return the last index."""
+        data = b''.join(RECORD.pack(*record) for record in records)
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(data)
+            self._file.flush()
+            self._count += len(data) // RECORD.size
+            return self._count - 1
+
+    def sync(self):
+        """Force appended records down to the disk."""
+        with self._lock:
+            os.fsync(self._file.fileno())
+
+    def latest(self):
+        """Return the last record as (index, received_at, values), or None if empty."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            index = self._count - 1
+            self._file.seek(HEADER.size + index * RECORD.size)
+            record = RECORD.unpack(self._file.read(RECORD.size))
+        return index, record[0], record[1:]
+
+    def read_range(self, start=0, stop=None):
+        """Return the records in [start, stop) as a list of (received_at, *values) tuples."""
+        with self._lock:
+            stop = self._count if stop is None else min(stop, self._count)
+            if start >= stop:
+                return []
+            self._file.seek(HEADER.size + start * RECORD.size)
+            data = self._file.read((stop - start) * RECORD.size)
+        return list(RECORD.iter_unpack(data))
+
+    def import_csv(self, csv_path):
+        """Load rows from a legacy gyro.csv; rows without a receive time get 0.0."""
+        records = []
+        with open(csv_path, mode='r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)  # Skip header
+            for row in reader:
+                try:
+                    records.append((0.0, *(float(value) for value in row[:6])))
+                except (ValueError, TypeError):
+                    continue
+        if records:
+            self.extend(records)
+        return len(records)
+
+    def iter_csv(self, chunk_size=4096):
+        """Yield the whole log as CSV text, one chunk of records at a time."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(POSE_FIELDS)
+        for start in range(0, len(self), chunk_size):
+            for record in self.read_range(start, start + chunk_size):
+                writer.writerow(record[1:])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+DURABILITY_MODES = ('none', 'batched', 'fsync')
+
+
+class PoseBuffer:
+    """Bounded ring of recent poses that serves reads and writes from memory.
+
+    Every pose gets a sequence id, which is simply its record index in the log,
+    and a server receive time. Receive times are kept non-decreasing so poses
+    can be looked up by time with a binary search as well as by sequence id.
+
+    Appends only touch the ring; a background thread moves pending poses to the
+    PoseStore in batches once flush_size poses are waiting or flush_interval
+    seconds have passed. Durability modes:
+      none    - keep poses in memory only, nothing is written to disk
+      batched - append each batch to the log and let the OS write it back
+      fsync   - append each batch and fsync before it counts as flushed
+    """
+
+    def __init__(self, store, capacity=4096, durability='batched', flush_size=256, flush_interval=0.5):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode {durability!r}, expected one of {DURABILITY_MODES}.")
+        self.store = store
+        self.capacity = capacity
+        self.durability = durability
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._ring = [None] * capacity
+        self._lock = threading.Lock()
+        self._new_pose = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._next_index = len(store)  # Index the next pose will get
+        self._flushed = len(store)     # Poses below this index are on disk
+        self._latest = store.latest()
+        self.waiters = 0  # Long-poll and stream readers blocked in wait_for_newer
+
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._flusher = threading.Thread(target=self._flush_loop, name='pose-flusher', daemon=True)
+        self._flusher.start()
+
+    def __len__(self):
+        return self._next_index
+
+    def append(self, received_at, values):
+        """Add one pose to the ring and return its index."""
+        return self.extend([(received_at, *values)])
+
+    def extend(self, records):
+        """Add (received_at, *values) tuples to the ring and return the last index."""
+        with self._lock:
+            index = self._next_index - 1
+            for record in records:
+                # Never overwrite a pose that has not reached the disk yet.
+                if self.durability != 'none' and self._next_index - self._flushed >= self.capacity:
+                    self._lock.release()
+                    try:
+                        self.flush()
+                    finally:
+                        self._lock.acquire()
+                index = self._next_index
+                if self._latest and record[0] < self._latest[1]:
+                    # Clamp clock steps backwards so receive times stay sorted.
+                    record = (self._latest[1], *record[1:])
+                self._ring[index % self.capacity] = record
+                self._next_index = index + 1
+                self._latest = (index, record[0], record[1:])
+            pending = self._next_index - self._flushed
+            self._new_pose.notify_all()
+        if pending >= self.flush_size:
+            self._wakeup.set()
+        return index
+
+    def latest(self):
+        """Return the newest pose as (index, received_at, values), or None if empty."""
+        return self._latest
+
+    def wait_for_newer(self, seq, timeout):
+        """Block until a pose newer than seq arrives or timeout seconds pass, then return the latest."""
+        with self._new_pose:
+            self.waiters += 1
+            try:
+                self._new_pose.wait_for(lambda: self._next_index - 1 > seq, timeout)
+            finally:
+                self.waiters -= 1
+            return self._latest
+
+    def pending(self):
+        """Number of poses not yet written to the store."""
+        return self._next_index - self._flushed
+
+    def first_available(self):
+        """Oldest sequence id read_range can still return.
+
+        Always 0 unless durability is 'none' and the ring has wrapped past the
+        poses on disk; older poses were never written and are gone.
+        """
+        with self._lock:
+            return self._first_available()
+
+    def _first_available(self):
+        ring_start = max(self._next_index - self.capacity, 0)
+        return ring_start if self.durability == 'none' and ring_start > len(self.store) else 0
+
+    def read_range(self, start=0, stop=None):
+        """Return poses in [start, stop), reading from the ring where possible.
+
+        start is moved up to first_available(), so the result may hold fewer
+        than stop - start poses.
+        """
+        return self._read_range(start, stop)[1]
+
+    def _read_range(self, start, stop):
+        """Return (first index read, poses) for [start, stop) after clamping start."""
+        with self._lock:
+            stop = self._next_index if stop is None else min(stop, self._next_index)
+            start = max(start, self._first_available())
+            ring_start = max(self._next_index - self.capacity, 0)
+            cached = [self._ring[index % self.capacity] for index in range(max(start, ring_start), stop)]
+        if start >= ring_start:
+            return start, cached
+        return start, self.store.read_range(start, min(stop, ring_start)) + cached
+
+    def index_at_time(self, timestamp):
+        """Return the sequence id of the first pose received at or after timestamp."""
+        low, high = self.first_available(), len(self)
+        while low < high:
+            middle = (low + high) // 2
+            records = self.read_range(middle, middle + 1)
+            # An empty read means the ring has moved past middle since low was taken
+            if not records or records[0][0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def iter_range(self, start=0, stop=None, chunk_size=1024):
+        """Yield (index, record) pairs in [start, stop) without materializing the whole range.
+
+        Iteration begins at first_available() if start is older than that.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        while start < stop:
+            first, chunk = self._read_range(start, min(start + chunk_size, stop))
+            for offset, record in enumerate(chunk):
+                yield first + offset, record
+            start = first + len(chunk)
+
+    def flush(self):
+        """Write every pending pose to the store."""
+        with self._flush_lock:
+            with self._lock:
+                start, stop = self._flushed, self._next_index
+                records = [self._ring[index % self.capacity] for index in range(start, stop)]
+            if not records:
+                return
+            if self.durability != 'none':
+                self.store.extend(records)
+                if self.durability == 'fsync':
+                    self.store.sync()
+            with self._lock:
+                self._flushed = stop
+
+    def close(self):
+        """Stop the flusher thread after writing out anything still pending."""
+        self._stopped = True
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing poses to %s: %s", self.store.path, e)
+                time.sleep(self.flush_interval)
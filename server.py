@@ -1,32 +1,425 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, Response, abort, g, make_response, send_from_directory, stream_with_context
 from flask_cors import CORS  # Import CORS
-import csv
+from array import array
+from itertools import islice
+import argparse
+import atexit
+import json
+import logging
+import math
+import mimetypes
 import os
+import sys
 import time
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+from analytics import AnalyticsLog
+from chunked_upload import ChunkedUploads, UploadError
+from compression import MSGPACK_MIMETYPES, compress_response, msgpack, pack, wants_msgpack
+from frame_slot import FRAME_MIMETYPES, FrameSlot, Image, sniff_mimetype, validate_frame
+from int_channel import IntChannel
+import logs
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, SIZE_BUCKETS, Registry
+from pose_store import POSE_FIELDS, RECORD, PoseBuffer, PoseStore
+from pipeline import Pipeline
+from sessions import Session, SessionRegistry
+from upload_queue import UploadQueue
+
+# Log records are handed to a background thread, so logging never blocks a request
+logs.configure(os.environ.get('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Directories and file paths
+# Directories and file paths. The default session keeps the original top-level
+# files; every other session gets the same layout under SESSION_ROOT/<id>/.
 UPLOAD_FOLDER = 'uploads'
 GYRO_FILE = 'gyro.csv'
+POSE_LOG_FILE = 'gyro.bin'
 RENDER_FILE = 'render.png'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+INT_CHANNEL_FILE = 'int_channel.bin'
+SESSION_ROOT = 'sessions'
+PARTIAL_UPLOAD_FOLDER = 'partial_uploads'
+DATASET_FOLDER = 'datasets'
+ANALYTICS_FOLDER = 'analytics'
+
+# Sessions are picked with the X-Session-Id header or ?session=, and closed after sitting idle
+DEFAULT_SESSION = 'default'
+SESSION_IDLE_TIMEOUT = float(os.environ.get('SESSION_IDLE_TIMEOUT', 600))
+SESSION_REAP_INTERVAL = float(os.environ.get('SESSION_REAP_INTERVAL', 30))
+
+# Largest request body accepted on any route, in megabytes
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('SERVER_MAX_CONTENT_MB', 1024)) * 1024 * 1024
+
+# GET /upload page sizes and the default lease on claimed uploads, in seconds
+UPLOAD_PAGE_LIMIT = 100
+UPLOAD_MAX_PAGE_LIMIT = 1000
+UPLOAD_LEASE_SECONDS = 300.0
+
+# Set PIPELINE_ENABLED=1 to turn every uploaded capture video into a NeRF dataset
+# (frame extraction, sharpness filtering, COLMAP + transforms.json) in the background
+PIPELINE_ENABLED = os.environ.get('PIPELINE_ENABLED') == '1'
+PIPELINE_VIDEO_FPS = float(os.environ.get('PIPELINE_VIDEO_FPS', 2))
+PIPELINE_KEEP_FRACTION = float(os.environ.get('PIPELINE_KEEP_FRACTION', 0.8))
+PIPELINE_CONCURRENCY = {
+    'extract': int(os.environ.get('PIPELINE_EXTRACT_WORKERS', 2)),
+    'filter': int(os.environ.get('PIPELINE_FILTER_WORKERS', 2)),
+    'reconstruct': int(os.environ.get('PIPELINE_RECONSTRUCT_WORKERS', 1)),
+}
+# Uploads claimed by the pipeline stay leased this long while their frames are extracted
+PIPELINE_LEASE_SECONDS = 3600.0
+
+# Resumable uploads: largest file, and how long an upload may sit without a new chunk
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_MB', 4096)) * 1024 * 1024
+UPLOAD_EXPIRY = float(os.environ.get('UPLOAD_EXPIRY', 3600))
+
+# Analytics log segments rotate every ANALYTICS_ROTATE_SECONDS; per-minute counts are kept
+# for ANALYTICS_RETAIN_MINUTES. Most events accepted by one POST /analytics batch.
+ANALYTICS_ROTATE_SECONDS = int(os.environ.get('ANALYTICS_ROTATE_SECONDS', 3600))
+ANALYTICS_RETAIN_MINUTES = int(os.environ.get('ANALYTICS_RETAIN_MINUTES', 1440))
+ANALYTICS_BATCH_MAX = 1000
+
+# Live pose buffer settings; durability is one of none / batched / fsync
+POSE_BUFFER_CAPACITY = int(os.environ.get('POSE_BUFFER_CAPACITY', 4096))
+POSE_DURABILITY = os.environ.get('POSE_DURABILITY', 'batched')
+POSE_FLUSH_SIZE = int(os.environ.get('POSE_FLUSH_SIZE', 256))
+POSE_FLUSH_INTERVAL = float(os.environ.get('POSE_FLUSH_INTERVAL', 0.5))
+
+# Set RENDER_WRITE_THROUGH=1 to also save every frame posted to /vrside as render.png
+# (render.jpg, render.webp or render.bin for frames uploaded in those encodings)
+RENDER_WRITE_THROUGH = os.environ.get('RENDER_WRITE_THROUGH') == '1'
+
+# Most recent integers kept in memory per session; set INT_CHANNEL_PERSIST=1 to also
+# append every integer to int_channel.bin so the channel survives restarts
+INT_CHANNEL_CAPACITY = int(os.environ.get('INT_CHANNEL_CAPACITY', 10000))
+INT_CHANNEL_PERSIST = os.environ.get('INT_CHANNEL_PERSIST') == '1'
+
+# Default and longest wait for a GET /vrside?after=<seq> long-poll, in milliseconds
+FRAME_DEFAULT_WAIT_MS = 10000
+FRAME_MAX_WAIT_MS = 30000
+
+# Most poses accepted by a single POST /gyro/batch
+POSE_BATCH_MAX = 10000
+
+# Longest a GET /gyro?wait=<ms> long-poll may block
+POSE_MAX_WAIT_MS = 30000
+
+# Seconds between keep-alive comments on an idle /gyro/stream connection
+POSE_STREAM_KEEPALIVE = 15.0
+
+# Page sizes for /gyro/all
+GYRO_PAGE_LIMIT = 1000
+GYRO_MAX_PAGE_LIMIT = 10000
+
+# JSON, CSV and MessagePack responses at least this large are gzip (or brotli) compressed
+# when the client sends Accept-Encoding; COMPRESS_MIN_SIZE=0 compresses everything
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 5))
+
+def open_pose_store(directory):
+    """Open a session's binary pose log, importing a legacy gyro.csv the first time."""
+    log_path = os.path.join(directory, POSE_LOG_FILE)
+    csv_path = os.path.join(directory, GYRO_FILE)
+    is_new = not os.path.exists(log_path)
+    store = PoseStore(log_path)
+    if is_new and os.path.exists(csv_path):
+        imported = store.import_csv(csv_path)
+        logger.info("Imported %d rows from %s into %s.", imported, csv_path, log_path)
+    return store
+
+def make_session(session_id, idle_timeout):
+    """Open the storage shard and in-memory state for one session."""
+    directory = '.' if session_id == DEFAULT_SESSION else os.path.join(SESSION_ROOT, session_id)
+    # Ensure required directories and files exist; the upload queue indexes the folder once here
+    upload_queue = UploadQueue(os.path.join(directory, UPLOAD_FOLDER))
 
-# Ensure required directories and files exist
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+    pose_store = open_pose_store(directory)
+    pose_buffer = PoseBuffer(pose_store, capacity=POSE_BUFFER_CAPACITY, durability=POSE_DURABILITY,
+                             flush_size=POSE_FLUSH_SIZE, flush_interval=POSE_FLUSH_INTERVAL)
+    frame_slot = FrameSlot(os.path.join(directory, RENDER_FILE) if RENDER_WRITE_THROUGH else None)
+    int_channel = IntChannel(INT_CHANNEL_CAPACITY,
+                             os.path.join(directory, INT_CHANNEL_FILE) if INT_CHANNEL_PERSIST else None)
+    return Session(session_id, directory, upload_queue, pose_store, pose_buffer, frame_slot, int_channel,
+                   idle_timeout)
 
-def ensure_gyro_file_exists():
-    """Ensure the gyro.csv file exists and has a header if created."""
-    if not os.path.exists(GYRO_FILE):
-        with open(GYRO_FILE, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['positionX', 'positionY', 'positionZ', 'rotationX', 'rotationY', 'rotationZ'])
-        print("Created gyro.csv with headers.")
+def has_active_jobs(session):
+    """True while a pipeline job for this session is queued or running; its upload lease lives in the session."""
+    return any(job.session_id == session.id and job.state in ('queued', 'running') for job in pipeline.list())
 
-ensure_gyro_file_exists()
+sessions = SessionRegistry(make_session, idle_timeout=SESSION_IDLE_TIMEOUT, reap_interval=SESSION_REAP_INTERVAL,
+                           busy=has_active_jobs)
+atexit.register(sessions.close_all)
+
+chunked_uploads = ChunkedUploads(PARTIAL_UPLOAD_FOLDER, max_size=UPLOAD_MAX_SIZE, expiry=UPLOAD_EXPIRY)
+pipeline = Pipeline(PIPELINE_CONCURRENCY, video_fps=PIPELINE_VIDEO_FPS, keep_fraction=PIPELINE_KEEP_FRACTION)
+
+analytics = AnalyticsLog(ANALYTICS_FOLDER, rotate_seconds=ANALYTICS_ROTATE_SECONDS,
+                         retain_minutes=ANALYTICS_RETAIN_MINUTES)
+atexit.register(analytics.close)
+
+def submit_upload_job(session, filename):
+    """Claim an uploaded capture video for the pipeline; the upload is acked once its frames are extracted.
+
+    Returns the Job, or None if the file is not a video or is already claimed.
+    """
+    if not (mimetypes.guess_type(filename)[0] or '').startswith('video/'):
+        return None
+    lease = session.upload_queue.claim_file(filename, PIPELINE_LEASE_SECONDS)
+    if lease is None:
+        return None
+
+    def ack_upload(job):
+        if session.closed:
+            # Closed through DELETE /sessions mid-job; a re-opened session re-indexed the folder
+            # and does not know this lease, so leave the file for it rather than delete it under it.
+            logger.warning("Session %s was closed while job %s ran; not acking %s.", session.id, job.id, filename)
+            return
+        session.upload_queue.ack(filename, lease["lease_id"])
+
+    return pipeline.submit(os.path.join(session.upload_folder, filename),
+                           os.path.join(session.directory, DATASET_FOLDER), session.id, ack_upload)
+
+def current_session():
+    """Session named by the X-Session-Id header or ?session= argument, opened on first use."""
+    if 'session' not in g:
+        session_id = request.headers.get('X-Session-Id') or request.args.get('session') or DEFAULT_SESSION
+        try:
+            g.session = sessions.get(session_id)
+        except ValueError as e:
+            abort(make_response(jsonify({"error": str(e)}), 400))
+    return g.session
+
+def json_object():
+    """The request's JSON body as a dict, {} if there is none; any other JSON value aborts with a 400."""
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        abort(make_response(jsonify({"error": "Expected a JSON object."}), 400))
+    return data
+
+# Fields available on every stored pose: sequence id, server receive time and the pose itself
+RECORD_FIELDS = ['seq', 'received_at'] + POSE_FIELDS
+
+def pose_to_dict(seq, received_at, values):
+    """Map a stored pose back to its field names."""
+    return dict(zip(RECORD_FIELDS, (seq, received_at, *values)))
+
+def parse_pose_batch():
+    """Parse a POST /gyro/batch body into (timestamp, *values) tuples.
+
+    JSON bodies are a list of pose objects (or {"poses": [...]}) with an optional
+    "timestamp" each. application/octet-stream bodies are packed little-endian
+    float64 records laid out like the pose log: timestamp, then the six pose
+    fields. Timestamps are the client's clock; None means "now".
+    """
+    if request.mimetype == 'application/octet-stream':
+        body = request.get_data()
+        if len(body) % RECORD.size:
+            raise ValueError(f"Binary batches must be a whole number of {RECORD.size}-byte records.")
+        if len(body) // RECORD.size > POSE_BATCH_MAX:
+            raise ValueError(f"Batches are limited to {POSE_BATCH_MAX} poses.")
+        records = list(RECORD.iter_unpack(body))
+    else:
+        data = request.get_json(silent=True)
+        poses = data.get('poses') if isinstance(data, dict) else data
+        if not isinstance(poses, list) or not all(isinstance(pose, dict) for pose in poses):
+            raise ValueError("Expected a JSON list of pose objects.")
+        if len(poses) > POSE_BATCH_MAX:
+            raise ValueError(f"Batches are limited to {POSE_BATCH_MAX} poses.")
+        try:
+            records = [(pose.get('timestamp'), *(float(pose[field]) for field in POSE_FIELDS)) for pose in poses]
+        except KeyError:
+            raise ValueError("Every pose needs position and rotation fields.")
+        except (TypeError, ValueError):
+            raise ValueError("Position and rotation fields must be numbers.")
+
+    if not all(math.isfinite(value) for record in records for value in record[1:]):
+        raise ValueError("Position and rotation fields must be finite numbers.")
+    return records
+
+def stamp_pose_batch(records, now):
+    """Map client timestamps onto the server clock, keeping the spacing between samples.
+
+    The last sample in the batch is taken to have been received now; samples
+    without a timestamp are stamped with now as well. Raises ValueError for
+    timestamps that are not finite numbers, since receive times must stay sortable.
+    """
+    try:
+        timestamps = [None if record[0] is None else float(record[0]) for record in records]
+    except (TypeError, ValueError):
+        raise ValueError("Pose timestamps must be numbers.")
+    if not all(math.isfinite(timestamp) for timestamp in timestamps if timestamp is not None):
+        raise ValueError("Pose timestamps must be finite numbers.")
+    known = [timestamp for timestamp in timestamps if timestamp is not None]
+    newest = max(known) if known else None
+    stamped = [(now if timestamp is None else now - (newest - timestamp), *record[1:])
+               for timestamp, record in zip(timestamps, records)]
+    # Timestamps far apart can still overflow once shifted onto the server clock
+    if not all(math.isfinite(record[0]) for record in stamped):
+        raise ValueError("Pose timestamps must be finite numbers.")
+    return stamped
+
+def pose_etag(seq):
+    """ETag for the pose with the given sequence id."""
+    return f"pose-{seq}"
+
+def stale_pose_seq(seq, pose_buffer):
+    """seq, or -1 if the pose buffer has not reached it, meaning it predates the buffer."""
+    return -1 if seq >= len(pose_buffer) else seq
+
+def known_pose_seq():
+    """Newest pose sequence id the client already has, from ?after= or If-None-Match.
+
+    A seq the session has not reached yet comes from before the session was
+    re-opened (seqs restart without a pose log), so it is treated as -1.
+    """
+    known = request.args.get('after', -1, type=int)
+    for etag in request.if_none_match.as_set():
+        if etag.startswith('pose-') and etag[5:].isdigit():
+            known = max(known, int(etag[5:]))
+    return stale_pose_seq(known, current_session().pose_buffer)
+
+# /gyro/all output formats, by the mimetype that selects them through Accept
+GYRO_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'columnar': 'application/octet-stream',
+    'msgpack': 'application/msgpack',
+}
+
+def parse_gyro_query(args):
+    """Parse the pagination, time window, projection and format arguments of /gyro/all."""
+    try:
+        start = int(args.get('cursor', args.get('offset', 0)))
+        if 'after' in args:
+            start = int(args['after']) + 1
+        limit = args.get('limit')
+        limit = None if limit is None else int(limit)
+        since = args.get('since')
+        since = None if since is None else float(since)
+        until = args.get('until')
+        until = None if until is None else float(until)
+    except ValueError:
+        raise ValueError("offset, cursor, after and limit must be integers; since and until must be timestamps.")
+    if start < 0 or (limit is not None and limit <= 0):
+        raise ValueError("offset and cursor must be >= 0 and limit must be > 0.")
+
+    fields = args.get('fields')
+    fields = RECORD_FIELDS if not fields else fields.split(',')
+    unknown = [field for field in fields if field not in RECORD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}.")
+
+    output_format = args.get('format') or negotiate_gyro_format()
+    if output_format not in GYRO_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(GYRO_FORMATS)}.")
+    if output_format == 'msgpack' and msgpack is None:
+        raise ValueError("format msgpack needs the msgpack package on the server.")
+    return start, limit, since, until, fields, output_format
+
+def negotiate_gyro_format():
+    """Pick a /gyro/all format from the Accept header when no ?format= is given; JSON by default."""
+    accept = request.accept_mimetypes
+    offered = [mimetype for mimetype in GYRO_FORMATS.values() if mimetype != 'application/msgpack' or msgpack]
+    best = accept.best_match(offered + (['application/x-msgpack'] if msgpack else []), 'application/json')
+    if best in MSGPACK_MIMETYPES:
+        return 'msgpack'
+    return next(name for name, mimetype in GYRO_FORMATS.items() if mimetype == best)
+
+def payload_response(payload, status=200):
+    """Reply with payload as MessagePack if the client asks for it through Accept, otherwise as JSON."""
+    if wants_msgpack(request.accept_mimetypes):
+        return Response(pack(payload), status=status, mimetype='application/msgpack')
+    return jsonify(payload), status
+
+def iter_gyro_rows(pose_buffer, start, since, until, fields):
+    """Yield (seq, projected row) for buffered poses inside the [since, until] window."""
+    if since is not None:
+        start = max(start, pose_buffer.index_at_time(since))
+    columns = [RECORD_FIELDS.index(field) - 1 for field in fields]
+    for seq, record in pose_buffer.iter_range(start):
+        if until is not None and record[0] > until:
+            break  # Receive times are sorted, nothing later can match
+        yield seq, [seq if column < 0 else record[column] for column in columns]
+
+def columnar_response(rows, fields, next_cursor):
+    """Pack rows as one little-endian float64 array per field, back to back."""
+    columns = [array('d') for _ in fields]
+    for _, row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+    headers = {"X-Pose-Fields": ','.join(fields), "X-Pose-Count": str(len(rows))}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    return Response(b''.join(column.tobytes() for column in columns),
+                    mimetype='application/octet-stream', headers=headers)
+
+# Request metrics, scraped from /metrics
+metrics = Registry()
+request_latency = metrics.histogram('relay_request_duration_seconds',
+                                    'Time spent in the handler, up to the response headers.', ('method', 'route'))
+request_body_size = metrics.histogram('relay_request_body_bytes', 'Request body sizes.', ('method', 'route'),
+                                      buckets=SIZE_BUCKETS)
+response_body_size = metrics.histogram('relay_response_body_bytes', 'Response body sizes (streamed bodies excluded).',
+                                       ('method', 'route'), buckets=SIZE_BUCKETS)
+requests_total = metrics.counter('relay_requests_total', 'Requests handled.', ('method', 'route', 'status'))
+
+def per_session(read):
+    return lambda: (((session.id,), read(session)) for session in sessions.list())
+
+metrics.gauge('relay_sessions_open', 'Open sessions.', collect=lambda: [((), len(sessions.list()))])
+metrics.gauge('relay_poses', 'Poses received.', ('session',), per_session(lambda s: len(s.pose_buffer)))
+metrics.gauge('relay_pose_pending', 'Poses waiting to be flushed to the pose log.', ('session',),
+              per_session(lambda s: s.pose_buffer.pending()))
+metrics.gauge('relay_pose_waiters', 'Readers blocked waiting for a new pose.', ('session',),
+              per_session(lambda s: s.pose_buffer.waiters))
+metrics.gauge('relay_frame_seq', 'Sequence id of the latest frame.', ('session',),
+              per_session(lambda s: s.frame_slot.latest().seq if s.frame_slot.latest() else -1))
+metrics.gauge('relay_frame_waiters', 'Readers blocked waiting for a new frame.', ('session',),
+              per_session(lambda s: s.frame_slot.waiters))
+metrics.gauge('relay_upload_queue_files', 'Files in the upload queue.', ('session',),
+              per_session(lambda s: len(s.upload_queue)))
+metrics.gauge('relay_pipeline_queue_depth', 'Jobs waiting for a pipeline stage.', ('stage',),
+              lambda: (((stage,), depth) for stage, depth in pipeline.queue_depths().items()))
+metrics.gauge('relay_analytics_pending', 'Analytics events waiting to be written to the log.',
+              collect=lambda: [((), analytics.pending())])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    if 'request_started' in g:
+        request_latency.observe(time.perf_counter() - g.request_started, request.method, route)
+    if request.content_length is not None:
+        request_body_size.observe(request.content_length, request.method, route)
+    if not response.is_streamed and response.content_length is not None:
+        response_body_size.observe(response.content_length, request.method, route)
+    requests_total.inc(request.method, route, str(response.status_code))
+    return response
+
+# Registered after the metrics hook so it runs first and the metrics see compressed sizes
+@app.after_request
+def compress_large_responses(response):
+    return compress_response(response, request.accept_encodings, COMPRESS_MIN_SIZE, COMPRESS_LEVEL)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Endpoint to expose request latencies, body sizes and queue depths in the Prometheus text format."""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """Reply with JSON when a body exceeds MAX_CONTENT_LENGTH."""
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({"error": f"Request body too large. The limit is {limit_mb} MB."}), 413
 
 @app.route('/')
 def index():
@@ -47,97 +440,353 @@ def upload_file():
     if file:
         timestamp = int(time.time())
         filename = secure_filename(f"{timestamp}_{file.filename}")
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        upload_queue = current_session().upload_queue
+        file.save(os.path.join(upload_queue.folder, filename))
+        upload_queue.add(filename)
+        if PIPELINE_ENABLED:
+            submit_upload_job(current_session(), filename)
         return jsonify({"message": f"File {filename} uploaded successfully!"}), 200
 
+def upload_error_response(e):
+    """JSON reply for a failed chunked upload request, with the upload's current offset when known."""
+    body = {"error": str(e)}
+    headers = {}
+    if e.upload:
+        body["offset"] = e.upload["offset"]
+        headers["Upload-Offset"] = str(e.upload["offset"])
+    return jsonify(body), e.status, headers
+
+@app.route('/upload/chunked', methods=['POST'])
+def create_chunked_upload():
+    """Endpoint to start a resumable upload.
+
+    Expects JSON {"filename": ..., "size": <bytes>, "sha256": <optional hex digest>}.
+    The client then PATCHes raw chunks to /upload/chunked/<id> with an
+    Upload-Offset header (and optionally X-Chunk-SHA256), asks HEAD for the
+    offset to resume from after a dropped connection, and POSTs
+    /upload/chunked/<id>/finalize once every byte has been sent.
+    """
+    data = json_object()
+    try:
+        session = current_session()
+        upload = chunked_uploads.create(data.get('filename'), data.get('size'),
+                                        session.upload_folder, data.get('sha256'), session.id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"upload_id": upload["id"], "offset": 0, "size": upload["size"],
+                    "expires_in": UPLOAD_EXPIRY}), 201, {"Upload-Offset": "0"}
+
+@app.route('/upload/chunked/<upload_id>', methods=['HEAD', 'GET'])
+def get_chunked_upload(upload_id):
+    """Endpoint reporting how many bytes of an upload have been received."""
+    try:
+        upload = chunked_uploads.status(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"upload_id": upload_id, "offset": upload["offset"], "size": upload["size"]}), 200, \
+        {"Upload-Offset": str(upload["offset"]), "Upload-Length": str(upload["size"])}
+
+@app.route('/upload/chunked/<upload_id>', methods=['PATCH'])
+def append_chunked_upload(upload_id):
+    """Endpoint streaming one chunk of the request body straight onto the partial file."""
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({"error": "Missing Upload-Offset header."}), 400
+    try:
+        upload = chunked_uploads.append(upload_id, offset, request.stream, request.content_length,
+                                        request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"upload_id": upload_id, "offset": upload["offset"], "size": upload["size"]}), 200, \
+        {"Upload-Offset": str(upload["offset"])}
+
+@app.route('/upload/chunked/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(upload_id):
+    """Endpoint to verify a fully received upload and move it into the uploads folder."""
+    data = json_object()
+    try:
+        upload = chunked_uploads.finish(upload_id, data.get('sha256'))
+    except UploadError as e:
+        return upload_error_response(e)
+    filename = os.path.basename(upload["path"])
+    session = sessions.get(upload["session_id"] or DEFAULT_SESSION)
+    session.upload_queue.add(filename)
+    if PIPELINE_ENABLED:
+        submit_upload_job(session, filename)
+    return jsonify({"message": f"File {filename} uploaded successfully!", "filename": filename}), 200
+
+@app.route('/upload/chunked/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """Endpoint to abandon an upload and delete what was received."""
+    try:
+        chunked_uploads.abort(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({"message": "Upload aborted."}), 200
+
 @app.route('/upload', methods=['GET'])
-def list_and_delete_files():
-    """Return all images from the uploads folder and then delete them."""
-    files = os.listdir(app.config['UPLOAD_FOLDER'])
-    if not files:
-        return jsonify({"message": "No files found in the uploads folder."}), 200
+def list_uploaded_files():
+    """Endpoint to page through uploaded files with their metadata, without deleting anything.
+
+    Query parameters: cursor (from the previous page's next_cursor), limit and
+    state (ready or claimed). Consumers take files with POST /upload/claim and
+    delete them with POST /upload/ack once processed.
+    """
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = min(request.args.get('limit', UPLOAD_PAGE_LIMIT, type=int), UPLOAD_MAX_PAGE_LIMIT)
+    state = request.args.get('state')
+    if limit <= 0 or state not in (None, 'ready', 'claimed'):
+        return jsonify({"error": "limit must be > 0 and state one of ready or claimed."}), 400
 
-    file_list = [os.path.join(app.config['UPLOAD_FOLDER'], f) for f in files]
-    for file_path in file_list:
-        os.remove(file_path)
+    files, next_cursor = current_session().upload_queue.list(cursor, limit, state)
+    if not files and cursor == 0:
+        return payload_response({"files": [], "next_cursor": None, "message": "No files found in the uploads folder."})
+    return payload_response({"files": files, "next_cursor": next_cursor})
 
-    return jsonify({"files": files, "message": "All files listed and deleted from uploads folder."}), 200
+@app.route('/upload/files/<filename>', methods=['GET'])
+def download_uploaded_file(filename):
+    """Endpoint to download one uploaded file, e.g. after claiming it."""
+    upload_queue = current_session().upload_queue
+    entry = upload_queue.get(filename)
+    if entry is None:
+        return jsonify({"error": "No such file"}), 404
+    return send_from_directory(os.path.abspath(upload_queue.folder), filename, mimetype=entry["content_type"])
+
+@app.route('/upload/claim', methods=['POST'])
+def claim_uploaded_files():
+    """Endpoint to lease the oldest unclaimed uploads to a processing worker.
+
+    Optional JSON: {"limit": <files, default 1>, "lease_seconds": <default 300>}.
+    Files not acked before the lease runs out become claimable again.
+    """
+    data = json_object()
+    limit = data.get('limit', 1)
+    lease_seconds = data.get('lease_seconds', UPLOAD_LEASE_SECONDS)
+    if not isinstance(limit, int) or limit <= 0 or not isinstance(lease_seconds, (int, float)) or lease_seconds <= 0:
+        return jsonify({"error": "'limit' and 'lease_seconds' must be positive numbers."}), 400
+
+    claimed = current_session().upload_queue.claim(min(limit, UPLOAD_MAX_PAGE_LIMIT), lease_seconds)
+    return jsonify({"claimed": claimed}), 200
+
+def lease_request():
+    """Parse the {"filename": ..., "lease_id": ...} body shared by ack and release."""
+    data = json_object()
+    return data.get('filename'), data.get('lease_id')
+
+@app.route('/upload/ack', methods=['POST'])
+def ack_uploaded_file():
+    """Endpoint for a worker to confirm it processed a claimed file, which deletes it."""
+    filename, lease_id = lease_request()
+    try:
+        current_session().upload_queue.ack(filename, lease_id)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"message": f"{filename} processed and deleted."}), 200
+
+@app.route('/upload/release', methods=['POST'])
+def release_uploaded_file():
+    """Endpoint for a worker to hand a claimed file back unprocessed."""
+    filename, lease_id = lease_request()
+    try:
+        current_session().upload_queue.release(filename, lease_id)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"message": f"{filename} released."}), 200
 
 # Gyro data functionalities for position and rotation
 @app.route('/gyro', methods=['POST'])
 def receive_gyro_data():
-    """Endpoint to receive position and rotation data from Unity and store them in gyro.csv."""
+    """Endpoint to receive position and rotation data from Unity into the live pose buffer."""
     data = request.get_json()
 
     # Check if all required fields are present
-    required_fields = ['positionX', 'positionY', 'positionZ', 'rotationX', 'rotationY', 'rotationZ']
-    if not data or not all(field in data for field in required_fields):
+    if not data or not all(field in data for field in POSE_FIELDS):
         return jsonify({"error": "Invalid data format. Expected position and rotation fields."}), 400
 
-    # Append the data to the CSV file
-    with open(GYRO_FILE, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([data['positionX'], data['positionY'], data['positionZ'], data['rotationX'], data['rotationY'], data['rotationZ']])
-        print(f"Data {data} saved to {GYRO_FILE}.")
+    try:
+        values = [float(data[field]) for field in POSE_FIELDS]
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid data format. Position and rotation fields must be numbers."}), 400
+    if not all(math.isfinite(value) for value in values):
+        return jsonify({"error": "Invalid data format. Position and rotation fields must be finite numbers."}), 400
+
+    # Buffer the pose in memory; the flusher thread writes it to the pose log
+    seq = current_session().pose_buffer.append(time.time(), values)
+
+    return jsonify({"message": "Gyro data received and stored successfully!", "seq": seq}), 200
 
-    return jsonify({"message": "Gyro data received and stored successfully!"}), 200
+@app.route('/gyro/batch', methods=['POST'])
+def receive_gyro_batch():
+    """Endpoint to receive many timestamped poses in one request and buffer them in one append."""
+    try:
+        records = stamp_pose_batch(parse_pose_batch(), time.time())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not records:
+        return jsonify({"error": "Empty batch."}), 400
+
+    last_seq = current_session().pose_buffer.extend(records)
+    return jsonify({"message": "Gyro batch received and stored successfully!",
+                    "accepted": len(records), "last_seq": last_seq}), 200
 
 @app.route('/gyro', methods=['GET'])
 def get_last_gyro_data():
-    """Endpoint to retrieve the last entry of position and rotation data from gyro.csv."""
-    try:
-        with open(GYRO_FILE, mode='r') as file:
-            reader = csv.reader(file)
-            last_row = None
-            for row in reader:
-                last_row = row
-            # Return the last data entry (ignoring the header if present)
-            if last_row:
-                return jsonify({"last_entry": {
-                    "positionX": last_row[0],
-                    "positionY": last_row[1],
-                    "positionZ": last_row[2],
-                    "rotationX": last_row[3],
-                    "rotationY": last_row[4],
-                    "rotationZ": last_row[5]
-                }}), 200
+    """Endpoint to retrieve the last entry of position and rotation data from the pose buffer.
+
+    Supports conditional requests: the response carries the pose sequence id as
+    its ETag and a matching If-None-Match gets a 304. With wait=<ms> the request
+    long-polls until a pose newer than the client's (If-None-Match or after=<seq>)
+    arrives or the timeout expires, and answers 304 if none arrives in time.
+    """
+    pose_buffer = current_session().pose_buffer
+    try:
+        wait_ms = min(request.args.get('wait', 0, type=int), POSE_MAX_WAIT_MS)
+        known = known_pose_seq() if wait_ms > 0 else None
+        if wait_ms > 0:
+            latest = pose_buffer.wait_for_newer(known, wait_ms / 1000.0)
+        else:
+            latest = pose_buffer.latest()
+
+        if latest:
+            etag = pose_etag(latest[0])
+            # A long-poll that timed out without a newer pose gets a 304 whether the
+            # client named its pose with If-None-Match or after=
+            if request.if_none_match.contains(etag) or (known is not None and latest[0] <= known):
+                response = Response(status=304)
             else:
-                return jsonify({"error": "No data available"}), 404
+                response = jsonify({"last_entry": pose_to_dict(*latest)})
+            response.set_etag(etag)
+            return response
+        else:
+            return jsonify({"error": "No data available"}), 404
     except Exception as e:
-        print(f"Error reading {GYRO_FILE}: {e}")
+        logger.error("Error reading %s: %s", POSE_LOG_FILE, e)
         return jsonify({"error": "Could not retrieve data"}), 500
 
+@app.route('/gyro/stream', methods=['GET'])
+def stream_gyro_data():
+    """Endpoint pushing each new pose to the client as Server-Sent Events.
+
+    Every subscriber waits on the pose buffer independently and is always sent
+    the newest pose, so a slow client skips stale poses (latest wins) instead
+    of building up a queue. Reconnecting clients resume with Last-Event-ID;
+    an id the session has not reached yet (it was re-opened) starts them over.
+    """
+    session = current_session()
+    last_seq = stale_pose_seq(request.headers.get('Last-Event-ID', -1, type=int), session.pose_buffer)
+
+    def events(last_seq):
+        # An open stream keeps its session alive; if the session is closed anyway
+        # end the stream so the client reconnects to a freshly opened one.
+        while not session.closed:
+            session.touch()
+            latest = session.pose_buffer.wait_for_newer(last_seq, POSE_STREAM_KEEPALIVE)
+            if latest is None or latest[0] <= last_seq:
+                yield ": keepalive\n\n"
+                continue
+            last_seq = latest[0]
+            yield f"id: {last_seq}\nevent: pose\ndata: {json.dumps(pose_to_dict(*latest))}\n\n"
+
+    return Response(stream_with_context(events(last_seq)), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/gyro/all', methods=['GET'])
 def get_all_gyro_data():
-    """Endpoint to retrieve all entries of position and rotation data from gyro.csv."""
-    try:
-        data = []
-        with open(GYRO_FILE, mode='r') as file:
-            reader = csv.reader(file)
-            next(reader)  # Skip header
-            for row in reader:
-                data.append({
-                    "positionX": row[0],
-                    "positionY": row[1],
-                    "positionZ": row[2],
-                    "rotationX": row[3],
-                    "rotationY": row[4],
-                    "rotationZ": row[5]
-                })
-        
-        if data:
-            return jsonify({"all_entries": data}), 200
-        else:
-            return jsonify({"message": "No data available"}), 404
+    """Endpoint to page through position and rotation data in the pose log.
+
+    Query parameters: offset or cursor (sequence id to start from), after
+    (only poses with a larger sequence id), limit, since / until (server
+    receive timestamps), fields (comma separated
+    projection) and format (json, ndjson for a streamed response, columnar
+    for packed float64 columns, or msgpack). Without format the Accept header
+    picks one, e.g. Accept: application/octet-stream for columnar. With
+    POSE_DURABILITY=none only the ring is kept; pages start no earlier than
+    the first_available sequence id reported in JSON responses.
+    """
+    try:
+        start, limit, since, until, fields, output_format = parse_gyro_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    pose_buffer = current_session().pose_buffer
+    if len(pose_buffer) == 0:
+        return jsonify({"message": "No data available"}), 404
+
+    rows = iter_gyro_rows(pose_buffer, start, since, until, fields)
+    if output_format == 'ndjson':
+        if limit is not None:
+            rows = islice(rows, limit)
+        lines = (json.dumps(dict(zip(fields, row))) + '\n' for _, row in rows)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    limit = min(limit or GYRO_PAGE_LIMIT, GYRO_MAX_PAGE_LIMIT)
+    try:
+        page = list(islice(rows, limit))
     except Exception as e:
-        print(f"Error reading {GYRO_FILE}: {e}")
+        logger.error("Error reading %s: %s", POSE_LOG_FILE, e)
         return jsonify({"error": "Could not retrieve data"}), 500
+    next_cursor = page[-1][0] + 1 if len(page) == limit else None
+
+    if output_format == 'columnar':
+        return columnar_response(page, fields, next_cursor)
+    payload = {
+        "all_entries": [dict(zip(fields, row)) for _, row in page],
+        "next_cursor": next_cursor,
+        "first_available": pose_buffer.first_available(),
+        "total": len(pose_buffer)
+    }
+    if output_format == 'msgpack':
+        return Response(pack(payload), mimetype='application/msgpack')
+    return jsonify(payload), 200
+
+@app.route('/gyro/export', methods=['GET'])
+def export_gyro_csv():
+    """Endpoint to download the pose log in the original gyro.csv format."""
+    session = current_session()
+    session.pose_buffer.flush()
+    return Response(session.pose_store.iter_csv(), mimetype='text/csv',
+                    headers={"Content-Disposition": f"attachment; filename={GYRO_FILE}"})
 
 # VR image handling functionalities
+def negotiate_frame_mimetype(frame):
+    """Pick the encoding to serve frame in from the Accept header, or None if nothing acceptable.
+
+    The stored encoding wins unless the client clearly prefers another one and
+    Pillow is available to convert it.
+    """
+    accept = request.accept_mimetypes
+    if not accept:
+        return frame.mimetype
+    stored_quality = accept[frame.mimetype]
+    best = accept.best_match(FRAME_MIMETYPES)
+    if stored_quality and (Image is None or accept[best] <= stored_quality):
+        return frame.mimetype
+    return best if Image is not None else None
+
 @app.route('/vrside', methods=['POST'])
 def save_render_image():
-    """Endpoint to receive an image and save it as render.png, overwriting the previous one."""
+    """Endpoint to receive an image and publish it as the latest frame, replacing the previous one.
+
+    Accepts either multipart form data with a 'file' part, or the image as the raw
+    request body (image/png, image/jpeg, image/webp, image/x-rgba with a
+    height/width header, or application/octet-stream to detect PNG/JPEG/WebP).
+    Either way, a body that is not a valid frame is rejected with 415.
+    """
+    if request.mimetype != 'multipart/form-data':
+        data = request.get_data()
+        mimetype = sniff_mimetype(data) if request.mimetype == 'application/octet-stream' else request.mimetype
+        try:
+            validate_frame(data, mimetype)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 415
+        frame = current_session().frame_slot.publish(data, mimetype)
+        return jsonify({"message": "Image uploaded and published as the latest frame", "seq": frame.seq,
+                        "encoding": frame.mimetype}), 200
+
     if 'file' not in request.files:
         return jsonify({"error": "No file part in the request"}), 400
 
@@ -146,21 +795,60 @@ def save_render_image():
         return jsonify({"error": "No file selected"}), 400
 
     if file:
-        file.save(RENDER_FILE)
-        print(f"Image saved as {RENDER_FILE}.")
-        return jsonify({"message": "Image uploaded and saved as render.png"}), 200
+        data = file.read()
+        mimetype = sniff_mimetype(data) or file.mimetype or mimetypes.guess_type(file.filename)[0] or 'image/png'
+        try:
+            validate_frame(data, mimetype)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 415
+        frame = current_session().frame_slot.publish(data, mimetype)
+        return jsonify({"message": "Image uploaded and published as the latest frame", "seq": frame.seq,
+                        "encoding": frame.mimetype}), 200
 
 @app.route('/vrside', methods=['GET'])
 def get_render_image():
-    """Endpoint to retrieve the render.png image."""
-    if os.path.exists(RENDER_FILE):
-        return send_file(RENDER_FILE, mimetype='image/png')
+    """Endpoint to retrieve the latest frame straight from memory.
+
+    Responses carry ETag, Last-Modified and X-Frame-Seq, and If-None-Match gets
+    a 304 when the client already has the frame. If-Modified-Since is ignored:
+    Last-Modified has one-second resolution and many frames share a second. With
+    after=<seq> the request long-polls (up to wait=<ms>) until a newer frame is
+    published, and answers 304 if none arrives in time. An after=<seq> this slot
+    has not reached yet comes from before a server restart or session re-open,
+    so the client is sent the latest frame straight away. The encoding follows
+    the Accept header, converting from the uploaded encoding when needed.
+    """
+    frame_slot = current_session().frame_slot
+    after = request.args.get('after', type=int)
+    if after is not None and after >= frame_slot.next_seq():
+        after = -1  # Stale seq from an earlier slot; start the client over
+    if after is not None:
+        wait_ms = min(request.args.get('wait', FRAME_DEFAULT_WAIT_MS, type=int), FRAME_MAX_WAIT_MS)
+        frame = frame_slot.wait_for_newer(after, wait_ms / 1000.0)
     else:
-        return jsonify({"error": "No image available"}), 404
+        frame = frame_slot.latest()
 
+    if frame:
+        mimetype = negotiate_frame_mimetype(frame)
+        if mimetype is None:
+            return jsonify({"error": f"Frame is only available as {frame.mimetype}."}), 406
+        headers = {"X-Frame-Seq": str(frame.seq), "Vary": "Accept"}
+        etag = frame.etag if mimetype == frame.mimetype else f"{frame.etag}-{mimetype.split('/')[1]}"
+        if (after is not None and frame.seq <= after) or request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+        else:
+            try:
+                data = frame_slot.encoded(frame, mimetype)
+            except Exception as e:
+                logger.error("Error converting frame %d to %s: %s", frame.seq, mimetype, e)
+                return jsonify({"error": "Could not convert frame"}), 500
+            response = Response(data, mimetype=mimetype, headers=headers)
+        response.set_etag(etag)
+        response.last_modified = frame.updated_at
+        return response
+    else:
+        return jsonify({"error": "No image available"}), 404
 
-# In-memory storage for integers (optional, depending on your use case)
-received_integers = []
 
 @app.route('/int_channel', methods=['POST'])
 def receive_single_integer():
@@ -176,36 +864,219 @@ def receive_single_integer():
         if not isinstance(value, int):
             return jsonify({"error": "Invalid input. 'value' must be an integer."}), 400
         
-        # Add the integer to in-memory storage (or process it as needed)
-        received_integers.append(value)
-        print(f"Received integer: {value}")
+        # Add the integer to the session's channel (or process it as needed)
+        try:
+            seq = current_session().int_channel.append(value)
+        except OverflowError:
+            return jsonify({"error": "Invalid input. 'value' must fit in a signed 64-bit integer."}), 400
+        logger.debug("Received integer: %d", value)
 
-        return jsonify({"message": "Integer received successfully!", "value": value}), 200
+        return jsonify({"message": "Integer received successfully!", "value": value, "seq": seq}), 200
     except Exception as e:
-        print(f"Error processing input: {e}")
+        logger.error("Error processing input: %s", e)
         return jsonify({"error": "An error occurred while processing the request."}), 500
 
+def parse_since():
+    """Read ?since=<seq> for the /int_channel reads; returns (start, error_response)."""
+    since = request.args.get('since')
+    if since is None:
+        return None, None
+    try:
+        return int(since) + 1, None
+    except ValueError:
+        return None, (jsonify({"error": "since must be an integer sequence id."}), 400)
+
 @app.route('/int_channel', methods=['GET'])
 def get_received_integers():
-    """Endpoint to retrieve all received integers."""
-    if not received_integers:
-        return jsonify({"message": "No integers received yet."}), 200
-    
-    return jsonify({"received_integers": received_integers}), 200
+    """Endpoint to retrieve the integers received in this session, optionally only those after ?since=<seq>."""
+    int_channel = current_session().int_channel
+    start, error = parse_since()
+    if error:
+        return error
+    if start is None:
+        if not len(int_channel):
+            return jsonify({"message": "No integers received yet."}), 200
+        start = max(len(int_channel) - int_channel.capacity, 0)
+
+    # Anything older than the ring (and not persisted) is gone; report where the returned values begin
+    start = max(start, int_channel.first_available())
+    received_integers = int_channel.read_range(start)
+    if request.accept_mimetypes.best_match(['application/json', 'application/octet-stream']) == 'application/octet-stream':
+        # Packed little-endian int64 values; the sequence range travels in headers
+        if sys.byteorder != 'little':
+            received_integers.byteswap()
+        return Response(received_integers.tobytes(), mimetype='application/octet-stream',
+                        headers={"X-First-Seq": str(start), "X-Count": str(len(received_integers))})
+    return payload_response({
+        "received_integers": received_integers.tolist(),
+        "first_seq": start,
+        "last_seq": start + len(received_integers) - 1,
+    })
+
+@app.route('/int_channel/stats', methods=['GET'])
+def get_integer_stats():
+    """Endpoint to summarize the session's integers: count, last value and a histogram of values."""
+    start, error = parse_since()
+    if error:
+        return error
+    return jsonify(current_session().int_channel.stats(start)), 200
+
+
+# Dataset processing jobs
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Endpoint to list this session's processing jobs and the pipeline's queue depths."""
+    session_id = current_session().id
+    jobs = [job.to_dict() for job in pipeline.list() if job.session_id == session_id]
+    return jsonify({"jobs": jobs, "queue_depths": pipeline.queue_depths()}), 200
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Endpoint to run the pipeline on an already uploaded file: {"filename": ...}."""
+    data = json_object()
+    session = current_session()
+    filename = data.get('filename')
+    if not filename or session.upload_queue.get(filename) is None:
+        return jsonify({"error": "No such uploaded file"}), 404
+    job = submit_upload_job(session, filename)
+    if job is None:
+        return jsonify({"error": "File is not a video, or is already claimed."}), 409
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Endpoint reporting a job's state and per-stage timings."""
+    job = pipeline.get(job_id)
+    if job is None:
+        return jsonify({"error": "No such job"}), 404
+    return jsonify(job.to_dict()), 200
+
+# Session management
+@app.route('/sessions', methods=['GET'])
+def list_sessions():
+    """Endpoint to list the sessions currently open on this server."""
+    return jsonify({"sessions": [session.describe() for session in sessions.list()]}), 200
+
+@app.route('/sessions/<session_id>', methods=['PUT'])
+def open_session(session_id):
+    """Endpoint to open a session ahead of time, optionally with its own idle timeout in seconds."""
+    data = json_object()
+    idle_timeout = data.get('idle_timeout')
+    if idle_timeout is not None and (not isinstance(idle_timeout, (int, float)) or idle_timeout <= 0):
+        return jsonify({"error": "'idle_timeout' must be a positive number of seconds."}), 400
+    try:
+        session = sessions.get(session_id, idle_timeout)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(session.describe()), 200
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    """Endpoint to close a session now, flushing its poses. Its files stay on disk."""
+    if not sessions.close(session_id):
+        return jsonify({"error": "No such open session"}), 404
+    return jsonify({"message": f"Session {session_id} closed."}), 200
 
 
 @app.route('/analytics', methods=['POST'])
 def handle_analytics():
+    """Endpoint to record one scene event, or a batch as a JSON list or {"events": [...]}."""
     # Handle both FormData and JSON
-    if request.content_type.startswith('multipart/form-data'):
-        scene_id = request.form.get('scene_id')
-        timestamp = request.form.get('timestamp')
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        data = request.form.to_dict()
     else:
-        data = request.get_json()
-        scene_id = data.get('scene_id')
-        timestamp = data.get('timestamp')
-    return jsonify({'status': 'success', 'message': 'Analytics recorded', 'id': str(scene_id)})
+        data = request.get_json(silent=True)
+    events = data.get('events') if isinstance(data, dict) and 'events' in data else data
+    is_batch = isinstance(events, list)
+    if not is_batch:
+        events = [events]
+    if len(events) > ANALYTICS_BATCH_MAX:
+        return jsonify({"error": f"At most {ANALYTICS_BATCH_MAX} events per request."}), 413
+
+    try:
+        recorded = analytics.ingest(events)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if is_batch:
+        return jsonify({'status': 'success', 'message': 'Analytics recorded', 'count': recorded})
+    return jsonify({'status': 'success', 'message': 'Analytics recorded', 'id': str(events[0]['scene_id'])})
+
+@app.route('/analytics/top_scenes', methods=['GET'])
+def get_top_scenes():
+    """Endpoint to list the scenes with the most events, busiest first."""
+    limit = request.args.get('limit', 10, type=int)
+    if limit <= 0:
+        return jsonify({"error": "limit must be a positive integer."}), 400
+    return jsonify({"scenes": analytics.top_scenes(limit)}), 200
+
+@app.route('/analytics/per_minute', methods=['GET'])
+def get_events_per_minute():
+    """Endpoint to get event counts per scene per minute, optionally for one ?scene= and a since/until range."""
+    since = request.args.get('since', type=float)
+    until = request.args.get('until', type=float)
+    return jsonify({"minutes": analytics.per_minute(request.args.get('scene'), since, until)}), 200
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Relay server for poses, rendered frames and uploads.")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=5000, help="Port to listen on.")
+    parser.add_argument("--threads", type=int, default=32,
+                        help="Worker threads. Long-polls and /gyro/stream subscribers each hold one while open.")
+    parser.add_argument("--max_content_mb", type=int, default=None,
+                        help="Largest request body in megabytes (default: SERVER_MAX_CONTENT_MB or 1024).")
+    parser.add_argument("--keep_alive", type=int, default=30,
+                        help="Seconds an idle keep-alive connection stays open (waitress only; the werkzeug "
+                             "fallback closes connections after every request).")
+    parser.add_argument("--debug", action="store_true", help="Run the Flask debug server with the reloader instead.")
+    return parser.parse_args()
+
+def serve(args):
+    """Serve the app with waitress, the production server for the relay.
 
+    waitress keeps connections alive between requests, which the pooled
+    RelayClient in pic.py and vr_nerf.py relies on. Without it the app falls
+    back to werkzeug's threaded server, which sends Connection: close on every
+    response; that is only meant for development.
+
+    All state (pose buffer, frames, sessions) lives in this process, so scale
+    with --threads rather than extra worker processes. Under gunicorn that
+    means a single gthread worker, e.g. gunicorn -w 1 -k gthread --threads 32 server:app
+    """
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        waitress_serve = None
+
+    if waitress_serve:
+        # waitress reads request bodies on its I/O thread before dispatching,
+        # so slow /upload clients do not tie up the worker threads.
+        logger.info("Serving on %s:%d with waitress (%d threads).", args.host, args.port, args.threads)
+        waitress_serve(app, host=args.host, port=args.port, threads=args.threads,
+                       channel_timeout=args.keep_alive, max_request_body_size=app.config['MAX_CONTENT_LENGTH'])
+        return
+
+    from werkzeug.serving import ThreadedWSGIServer
+    from concurrent.futures import ThreadPoolExecutor
+
+    class PooledWSGIServer(ThreadedWSGIServer):
+        """werkzeug server that hands each connection to a bounded thread pool."""
+        pool = ThreadPoolExecutor(max_workers=args.threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+    logger.warning("waitress is not installed; serving on %s:%d with werkzeug (%d threads), which closes every "
+                   "connection after one request. Install waitress (pip install waitress) for production.",
+                   args.host, args.port, args.threads)
+    server = PooledWSGIServer(args.host, args.port, app)
+    server.serve_forever()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    args = parse_args()
+    if args.max_content_mb is not None:
+        app.config['MAX_CONTENT_LENGTH'] = args.max_content_mb * 1024 * 1024
+    if args.debug:
+        app.run(host=args.host, port=args.port, debug=True)
+    else:
+        serve(args)
@@ -0,0 +1,131 @@
+"""Per-session relay state so several headsets or scenes can share one server."""
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class Session:
+    """Pose, frame, integer and upload state for one VR client or scene.
+
+    Sessions never share locks or files; the registry only hands them out.
+    Anything a session opens is released by close(), which the registry calls
+    once the session has been idle for idle_timeout seconds.
+    """
+
+    def __init__(self, session_id, directory, upload_queue, pose_store, pose_buffer, frame_slot, int_channel,
+                 idle_timeout):
+        self.id = session_id
+        self.directory = directory
+        self.upload_queue = upload_queue
+        self.upload_folder = upload_queue.folder
+        self.pose_store = pose_store
+        self.pose_buffer = pose_buffer
+        self.frame_slot = frame_slot
+        self.int_channel = int_channel
+        self.idle_timeout = idle_timeout
+        self.created_at = time.time()
+        self.last_seen = time.monotonic()
+        self.closed = False
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def idle_for(self):
+        return time.monotonic() - self.last_seen
+
+    def close(self):
+        """Flush pending poses and release the session's files."""
+        self.closed = True
+        self.pose_buffer.close()
+        self.pose_store.close()
+        self.int_channel.close()
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "idle_seconds": round(self.idle_for(), 3),
+            "idle_timeout": self.idle_timeout,
+            "poses": len(self.pose_buffer),
+            "integers": len(self.int_channel),
+            "frame_seq": self.frame_slot.latest().seq if self.frame_slot.latest() else None,
+        }
+
+
+class SessionRegistry:
+    """Creates sessions on first use and closes them once they sit idle.
+
+    factory(session_id, idle_timeout) builds a Session; a background thread
+    checks every reap_interval seconds for sessions idle past their timeout.
+    Sessions for which busy(session) is true are kept open however idle they are.
+    """
+
+    def __init__(self, factory, idle_timeout=600.0, reap_interval=30.0, busy=None):
+        self.factory = factory
+        self.busy = busy
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name='session-reaper', daemon=True)
+        self._reaper.start()
+
+    def get(self, session_id, idle_timeout=None):
+        """Return the open session with this id, creating it if needed."""
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError("Session ids must be 1-64 letters, digits, '-' or '_'.")
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self.factory(session_id, idle_timeout or self.idle_timeout)
+                self._sessions[session_id] = session
+            elif idle_timeout:
+                session.idle_timeout = idle_timeout
+            session.touch()
+        return session
+
+    def list(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def close(self, session_id):
+        """Close one session; returns False if it was not open."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def close_idle(self):
+        """Close every session idle past its timeout and return their ids."""
+        with self._lock:
+            idle = [session for session in self._sessions.values()
+                    if session.idle_for() > session.idle_timeout and not (self.busy and self.busy(session))]
+            for session in idle:
+                del self._sessions[session.id]
+        for session in idle:
+            try:
+                session.close()
+            except Exception as e:
+                logger.error("Error closing idle session %s: %s", session.id, e)
+        return [session.id for session in idle]
+
+    def close_all(self):
+        self._stopped.set()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def _reap_loop(self):
+        while not self._stopped.wait(self.reap_interval):
+            for session_id in self.close_idle():
+                logger.info("Closed idle session %s.", session_id)
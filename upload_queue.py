@@ -0,0 +1,146 @@
+"""Index of files in an uploads folder, consumed with claim/ack leases."""
+import bisect
+import mimetypes
+import os
+import threading
+import time
+import uuid
+
+
+class UploadQueue:
+    """Keeps an in-memory index of one uploads folder so listing is O(page).
+
+    The folder is scanned once at startup; after that every new file is added
+    with add(). Consumers claim files, which leases them for lease_seconds, and
+    ack them once processed, which deletes the file. A lease that runs out or
+    is released puts the file back in the ready state for another consumer.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._entries = {}   # Entry id -> entry
+        self._ids = []       # Entry ids in upload order
+        self._by_name = {}   # Filename -> entry id
+        self._next_id = 0
+        os.makedirs(folder, exist_ok=True)
+        names = [name for name in os.listdir(folder) if os.path.isfile(os.path.join(folder, name))]
+        for name in sorted(names, key=lambda name: os.path.getmtime(os.path.join(folder, name))):
+            self.add(name)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, filename):
+        """Index a file that has just been written to the folder and return its entry."""
+        stat = os.stat(os.path.join(self.folder, filename))
+        with self._lock:
+            if filename in self._by_name:
+                self._remove(self._by_name[filename])
+            entry = {
+                "id": self._next_id,
+                "filename": filename,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "content_type": mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                "state": 'ready',
+                "lease_id": None,
+                "lease_expires": None,
+            }
+            self._next_id += 1
+            self._entries[entry["id"]] = entry
+            self._ids.append(entry["id"])
+            self._by_name[filename] = entry["id"]
+            return dict(entry)
+
+    def list(self, cursor=0, limit=100, state=None):
+        """Return up to limit entries with id >= cursor (optionally only in one state) and the next cursor."""
+        now = time.time()
+        page = []
+        with self._lock:
+            position = bisect.bisect_left(self._ids, cursor)
+            while position < len(self._ids) and len(page) < limit:
+                entry = self._entries[self._ids[position]]
+                self._expire_lease(entry, now)
+                if state is None or entry["state"] == state:
+                    page.append(self._public(entry))
+                position += 1
+            next_cursor = self._ids[position] if position < len(self._ids) else None
+        return page, next_cursor
+
+    def get(self, filename):
+        with self._lock:
+            entry_id = self._by_name.get(filename)
+            return None if entry_id is None else self._public(self._entries[entry_id])
+
+    def claim(self, limit=1, lease_seconds=300.0):
+        """Atomically lease up to limit ready files, oldest first."""
+        now = time.time()
+        claimed = []
+        with self._lock:
+            for entry_id in self._ids:
+                if len(claimed) >= limit:
+                    break
+                entry = self._entries[entry_id]
+                self._expire_lease(entry, now)
+                if entry["state"] != 'ready':
+                    continue
+                entry["state"] = 'claimed'
+                entry["lease_id"] = uuid.uuid4().hex
+                entry["lease_expires"] = now + lease_seconds
+                claimed.append(dict(entry))
+        return claimed
+
+    def claim_file(self, filename, lease_seconds=300.0):
+        """Lease one specific ready file; returns its entry with the lease id, or None if unavailable."""
+        now = time.time()
+        with self._lock:
+            entry_id = self._by_name.get(filename)
+            if entry_id is None:
+                return None
+            entry = self._entries[entry_id]
+            self._expire_lease(entry, now)
+            if entry["state"] != 'ready':
+                return None
+            entry.update(state='claimed', lease_id=uuid.uuid4().hex, lease_expires=now + lease_seconds)
+            return dict(entry)
+
+    def ack(self, filename, lease_id):
+        """Delete a claimed file once its consumer is done with it."""
+        with self._lock:
+            entry = self._leased_entry(filename, lease_id)
+            self._remove(entry["id"])
+        path = os.path.join(self.folder, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def release(self, filename, lease_id):
+        """Give a claimed file back without deleting it."""
+        with self._lock:
+            entry = self._leased_entry(filename, lease_id)
+            entry.update(state='ready', lease_id=None, lease_expires=None)
+
+    def _leased_entry(self, filename, lease_id):
+        entry_id = self._by_name.get(filename)
+        entry = None if entry_id is None else self._entries[entry_id]
+        if entry is None:
+            raise FileNotFoundError(f"No upload named {filename}.")
+        self._expire_lease(entry, time.time())
+        if entry["state"] != 'claimed' or entry["lease_id"] != lease_id:
+            raise PermissionError(f"{filename} is not leased under that lease id.")
+        return entry
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        del self._by_name[entry["filename"]]
+        del self._ids[bisect.bisect_left(self._ids, entry_id)]
+
+    @staticmethod
+    def _expire_lease(entry, now):
+        if entry["state"] == 'claimed' and entry["lease_expires"] < now:
+            entry.update(state='ready', lease_id=None, lease_expires=None)
+
+    @staticmethod
+    def _public(entry):
+        """Entry as shown in listings; lease ids are only handed to the claimer."""
+        return {key: value for key, value in entry.items() if key != 'lease_id'}